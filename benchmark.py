@@ -0,0 +1,982 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the hotkey daemon
+Runs on any platform - OS calls are replaced by in-memory fakes
+"""
+
+import os
+import sys
+import stat
+import errno
+import time
+import random
+import ctypes
+import tempfile
+import contextlib
+import json
+import subprocess
+import concurrent.futures
+from types import SimpleNamespace
+
+from PIL import Image, ImageDraw
+
+import hotkey
+
+
+def report(label, samples_ms):
+    print(f"  {label:<28} p50 {hotkey.percentile(samples_ms, 50):8.2f} ms   "
+          f"p99 {hotkey.percentile(samples_ms, 99):8.2f} ms   max {max(samples_ms):8.2f} ms")
+
+
+def slow_resolver(rng, answer, fast_ms, slow_ms, slow_rate, hit_rate):
+    """Fake resolver that usually answers in fast_ms but sometimes stalls for slow_ms"""
+    def resolve(ctx):
+        delay = slow_ms if rng.random() < slow_rate else fast_ms
+        time.sleep(delay / 1000.0)
+        return answer if rng.random() < hit_rate else None
+    return resolve
+
+
+def bench_parallel_resolution(gestures=200, deadline=0.15):
+    """Sequential chain vs deadline-bounded parallel resolution with fake slow backends"""
+    print(f"\nResolution latency, {gestures} editor gestures (deadline {deadline * 1000:.0f} ms)")
+    rng = random.Random(1)
+    registry = hotkey.ResolverRegistry()
+    # Repo search / COM style lookup: usually quick, sometimes stuck on a slow volume
+    registry.register('editor', slow_resolver(rng, '/work/project', 5, 400, 0.05, 0.6),
+                      priority=20, processes=['code.exe'])
+    # Clipboard read: slow-ish and rarely useful
+    registry.register('clipboard', slow_resolver(rng, '/work/clone', 30, 250, 0.10, 0.2),
+                      priority=30, processes=['code.exe'])
+    registry.register('cwd', slow_resolver(rng, '/work', 1, 1, 0.0, 0.5),
+                      priority=50, fallback=True)
+    registry.register('default', lambda ctx: '/home/user/Documents',
+                      priority=100, fallback=True)
+    ctx = hotkey.WindowContext(1, None, 'code.exe', 'main.py - project - Visual Studio Code', 'Chrome_WidgetWin_1')
+
+    sequential = []
+    for _ in range(gestures):
+        started = time.perf_counter()
+        registry.resolve(ctx)
+        sequential.append((time.perf_counter() - started) * 1000)
+
+    parallel = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+        for _ in range(gestures):
+            started = time.perf_counter()
+            registry.resolve_parallel(ctx, pool, deadline)
+            parallel.append((time.perf_counter() - started) * 1000)
+
+    report("sequential", sequential)
+    report("parallel + deadline", parallel)
+    print(f"  deadline misses: {registry.deadline_misses}")
+
+
+def synthetic_screenshot(width, height, seed=1):
+    """Page-like test image: flat background, text-ish stripes and a noisy photo block"""
+    rng = random.Random(seed)
+    image = Image.new('RGB', (width, height), (250, 250, 250))
+    draw = ImageDraw.Draw(image)
+    for top in range(40, height - 20, 24):
+        left = 40
+        while left < width // 2:
+            word = rng.randint(20, 90)
+            draw.rectangle((left, top, left + word, top + 10), fill=(40, 40, 40))
+            left += word + 12
+    photo = Image.effect_noise((width // 3, height // 3), 64).convert('RGB')
+    image.paste(photo, (width // 2 + 40, 60))
+    return image
+
+
+def bench_screenshot_encoding(repeats=3):
+    """Inline PNG save vs reserve+submit, and encode cost per format/size"""
+    sizes = [(1920, 1080), (2560, 1440), (3840, 2160)]
+    configs = [
+        ('PNG level 6', dict(image_format='PNG', compress_level=6)),
+        ('PNG level 1', dict(image_format='PNG', compress_level=1)),
+        ('PNG level 1, max 1920', dict(image_format='PNG', compress_level=1, max_dimension=1920)),
+        ('JPEG q85', dict(image_format='JPEG', quality=85)),
+    ]
+    print(f"\nScreenshot encoding, best of {repeats}")
+    with tempfile.TemporaryDirectory() as save_dir:
+        for width, height in sizes:
+            image = synthetic_screenshot(width, height)
+            print(f"  {width}x{height}")
+            for label, options in configs:
+                encoder = hotkey.ScreenshotEncoder(**options)
+                best, size = None, 0
+                for _ in range(repeats):
+                    filepath = encoder.reserve(save_dir)
+                    started = time.perf_counter()
+                    encoder.encode(image, filepath)
+                    elapsed = (time.perf_counter() - started) * 1000
+                    best = elapsed if best is None else min(best, elapsed)
+                    size = os.path.getsize(filepath)
+                print(f"    {label:<24} encode {best:8.1f} ms   {size / 1024:8.0f} KiB")
+
+            # What the click path pays: old inline save vs reserving a name and queueing
+            encoder = hotkey.ScreenshotEncoder()
+            started = time.perf_counter()
+            image.save(os.path.join(save_dir, 'inline.png'), 'PNG')
+            inline = (time.perf_counter() - started) * 1000
+            started = time.perf_counter()
+            encoder.submit(image, encoder.reserve(save_dir))
+            queued = (time.perf_counter() - started) * 1000
+            encoder.flush()
+            encoder.stop()
+            print(f"    click path: inline save {inline:8.1f} ms   async submit {queued:8.3f} ms")
+
+
+def bench_screenshot_store(captures=12, distinct=4):
+    """Content-addressed store: repeated captures of an unchanged page skip the encode"""
+    print(f"\nScreenshot store, {captures} 1920x1080 captures of {distinct} distinct pages")
+    pages = [synthetic_screenshot(1920, 1080, seed) for seed in range(distinct)]
+    with tempfile.TemporaryDirectory() as save_dir:
+        store = hotkey.ScreenshotStore()
+        first, repeat = [], []
+        for i in range(captures):
+            page = pages[i % distinct]
+            filepath = store.reserve(save_dir)
+            deduped = store.deduped
+            started = time.perf_counter()
+            store.encode(page, filepath)
+            elapsed = (time.perf_counter() - started) * 1000
+            (repeat if store.deduped > deduped else first).append(elapsed)
+        stored = os.path.join(save_dir, store.store_name)
+        size = sum(os.path.getsize(os.path.join(stored, name)) for name in os.listdir(stored))
+        names = len(os.listdir(save_dir)) - 1
+    report('new content (hash + encode)', first)
+    report('repeat (hash + link)', repeat)
+    print(f"  save dir holds {names} capture names, store {size / 1024:,.0f} KiB for {captures} captures")
+
+
+class FakeModifiers:
+    """Stand-in for KeyStateModifiers"""
+
+    def __init__(self, shift=True):
+        self.shift = shift
+
+    def shift_pressed(self):
+        return self.shift
+
+
+def bench_keyboard_hook(keystrokes=200000, clicks=20000):
+    """Per-keystroke cost of the old Shift-tracking keyboard hook vs sampling on click"""
+    print(f"\nModifier tracking, {keystrokes} keystrokes and {clicks} middle-clicks")
+
+    # The removed design: every key event system-wide became a Python call that
+    # built a key object and compared it against the Shift keys
+    Key = type('Key', (), {})
+    shift_l, shift_r = Key(), Key()
+    state = {'shift': False}
+
+    def on_press(key):
+        if key == shift_l or key == shift_r:
+            state['shift'] = True
+
+    def on_release(key):
+        if key == shift_l or key == shift_r:
+            state['shift'] = False
+
+    events = [(on_press if i % 2 == 0 else on_release, shift_l if i % 50 == 0 else Key())
+              for i in range(keystrokes)]
+    started = time.perf_counter()
+    for callback, key in events:
+        callback(key)
+    hooked = (time.perf_counter() - started) / keystrokes * 1e9
+
+    # GetAsyncKeyState where it exists, otherwise only the Python call overhead
+    if hotkey.win32api is not None:
+        modifiers, label = hotkey.KeyStateModifiers(), 'GetAsyncKeyState'
+    else:
+        modifiers, label = FakeModifiers(), 'fake modifiers'
+    started = time.perf_counter()
+    for _ in range(clicks):
+        modifiers.shift_pressed()
+    sampled = (time.perf_counter() - started) / clicks * 1e9
+
+    # Sampling runs no code per keystroke, so compare what each design costs in total
+    print(f"  keyboard hook      {hooked:8.0f} ns per keystroke, {hooked * keystrokes / 1e6:8.2f} ms in total "
+          f"(plus hook marshalling in pynput)")
+    print(f"  sample on click    {sampled:8.0f} ns per middle-click, {sampled * clicks / 1e6:8.2f} ms in total "
+          f"({label})")
+
+
+class MSLLHOOKSTRUCT(ctypes.Structure):
+    """Same layout as the struct a WH_MOUSE_LL hook receives"""
+    _fields_ = [
+        ('x', ctypes.c_long),
+        ('y', ctypes.c_long),
+        ('mouseData', ctypes.c_ulong),
+        ('flags', ctypes.c_ulong),
+        ('time', ctypes.c_ulong),
+        ('dwExtraInfo', ctypes.c_void_p),
+    ]
+
+
+WM_MOUSEMOVE = 0x0200
+WM_LBUTTONDOWN = 0x0201
+WM_LBUTTONUP = 0x0202
+WM_MBUTTONUP = 0x0208
+WM_MOUSEWHEEL = 0x020A
+
+
+def synthetic_mouse_events(count, seed=1):
+    """Mostly moves with some wheel and clicks - what a gaming mouse produces"""
+    rng = random.Random(seed)
+    events = []
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.0005:
+            msg = rng.choice([hotkey.WM_MBUTTONDOWN, WM_MBUTTONUP])
+        elif roll < 0.005:
+            msg = rng.choice([WM_LBUTTONDOWN, WM_LBUTTONUP])
+        elif roll < 0.02:
+            msg = WM_MOUSEWHEEL
+        else:
+            msg = WM_MOUSEMOVE
+        events.append(msg)
+    return events
+
+
+def bench_mouse_event_filter(events=200000):
+    """CPU cost of the mouse hook path with and without the early event filter"""
+    print(f"\nMouse hook path, {events} synthetic events")
+    if hotkey.mouse is None:
+        # pynput needs a display; the benchmark only needs the button names
+        hotkey.mouse = SimpleNamespace(Button=SimpleNamespace(left='left', middle='middle'))
+    Button = hotkey.mouse.Button
+    clicks = {
+        WM_LBUTTONDOWN: (Button.left, True), WM_LBUTTONUP: (Button.left, False),
+        hotkey.WM_MBUTTONDOWN: (Button.middle, True), WM_MBUTTONUP: (Button.middle, False),
+    }
+    on_move = lambda x, y: None
+    on_scroll = lambda x, y, dx, dy: None
+
+    struct = MSLLHOOKSTRUCT(100, 200, 0, 0, 0, None)
+    lpdata = ctypes.addressof(struct)
+    pointer_type = ctypes.POINTER(MSLLHOOKSTRUCT)
+    stream = synthetic_mouse_events(events)
+
+    def hook(app, event_filter):
+        # Mirrors pynput's win32 mouse listener: cast, filter, translate, dispatch
+        for msg in stream:
+            data = ctypes.cast(lpdata, pointer_type).contents
+            if event_filter is not None and event_filter(msg, data) is False:
+                continue
+            if msg == WM_MOUSEMOVE:
+                on_move(data.x, data.y)
+            elif msg in clicks:
+                button, pressed = clicks[msg]
+                app.on_click(data.x, data.y, button, pressed)
+            elif msg == WM_MOUSEWHEEL:
+                on_scroll(data.x, data.y, 0, ctypes.c_short(data.mouseData >> 16).value)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        app = hotkey.GeminiDoubleMiddleClick(modifiers=FakeModifiers(shift=False),
+                                             state_dir=root, appdata_dir=root)
+        for label, event_filter in [('unfiltered', None), ('middle_button_filter', hotkey.middle_button_filter)]:
+            started = time.process_time()
+            hook(app, event_filter)
+            results[label] = (time.process_time() - started) / events
+        close_app(app)
+
+    for label, per_event in results.items():
+        print(f"  {label:<22} {per_event * 1e9:7.0f} ns/event   "
+              f"{1 / per_event:12,.0f} events/s   "
+              f"CPU at 1 kHz {per_event * 1000 * 100:5.2f}%   at 8 kHz {per_event * 8000 * 100:5.2f}%")
+
+
+# --- In-memory OS backends ---
+
+class FakeWindow:
+    def __init__(self, hwnd, kind, pid, title, window_class, folder=None):
+        self.hwnd = hwnd
+        self.kind = kind  # label used in the report
+        self.pid = pid
+        self.title = title
+        self.window_class = window_class
+        self.folder = folder  # what Explorer's shell reports for it
+
+
+class FakeDesktop:
+    """WindowsDesktop stand-in: windows tiled on a grid, one per cell"""
+
+    CELL = 100
+
+    def __init__(self, windows, columns=32):
+        self.windows = {window.hwnd: window for window in windows}
+        self.order = [window.hwnd for window in windows]
+        self.columns = columns
+        self.clipboard = ""
+        self.image = Image.new('RGB', (64, 48))
+
+    def position(self, hwnd):
+        """Centre of the cell a window occupies"""
+        index = self.order.index(hwnd)
+        return (index % self.columns) * self.CELL + self.CELL // 2, (index // self.columns) * self.CELL + self.CELL // 2
+
+    def window_from_point(self, x, y):
+        index = (y // self.CELL) * self.columns + x // self.CELL
+        return self.order[index] if 0 <= index < len(self.order) else 0
+
+    def parent(self, hwnd):
+        return 0
+
+    def window_process_id(self, hwnd):
+        return self.windows[hwnd].pid
+
+    def window_text(self, hwnd):
+        return self.windows[hwnd].title
+
+    def window_class(self, hwnd):
+        return self.windows[hwnd].window_class
+
+    def window_rect(self, hwnd):
+        x, y = self.position(hwnd)
+        return x - 50, y - 50, x + 50, y + 50
+
+    def foreground_window(self):
+        return self.order[0]
+
+    def grab(self, bbox):
+        return self.image
+
+    def clipboard_paste(self):
+        return self.clipboard
+
+    def clipboard_copy(self, text):
+        self.clipboard = text
+
+
+class FakeProcess:
+    """psutil.Process stand-in with fixed answers"""
+
+    def __init__(self, pid, name, cmdline, cwd, create_time=1000.0):
+        self.pid = pid
+        self._name = name
+        self._cmdline = cmdline
+        self._cwd = cwd
+        self._create_time = create_time
+
+    def create_time(self):
+        return self._create_time
+
+    def oneshot(self):
+        return contextlib.nullcontext()
+
+    def name(self):
+        return self._name
+
+    def cmdline(self):
+        return list(self._cmdline)
+
+    def cwd(self):
+        return self._cwd
+
+
+class FakeShell:
+    """ShellApplicationBackend stand-in backed by the fake desktop's Explorer windows"""
+
+    def __init__(self, desktop):
+        self.desktop = desktop
+
+    def initialize(self):
+        pass
+
+    def uninitialize(self):
+        pass
+
+    def window_count(self):
+        return sum(1 for window in self.desktop.windows.values() if window.folder)
+
+    def windows(self):
+        for window in self.desktop.windows.values():
+            if window.folder:
+                yield window.hwnd, window
+
+    def folder(self, window):
+        return window.folder
+
+
+class FakeEncoder:
+    """ScreenshotEncoder stand-in that only hands out names"""
+
+    def __init__(self):
+        self.count = 0
+
+    def reserve(self, save_dir):
+        self.count += 1
+        return os.path.join(save_dir, f"browser_screenshot_{self.count}.png")
+
+    def submit(self, image, filepath):
+        pass
+
+    def stop(self):
+        pass
+
+
+def write_editor_state(appdata_dir, folders):
+    """Recent-workspace state files as VS Code and Cursor write them"""
+    for product in hotkey.EDITOR_STATE_DIRS.values():
+        storage = os.path.join(appdata_dir, product, 'User', 'workspaceStorage')
+        for i, folder in enumerate(folders):
+            os.makedirs(os.path.join(storage, f"{i:032x}"), exist_ok=True)
+            with open(os.path.join(storage, f"{i:032x}", 'workspace.json'), 'w', encoding='utf-8') as f:
+                json.dump({'folder': 'file:///' + folder.replace(os.sep, '/').lstrip('/')}, f)
+
+
+def fake_session(root, windows=200, seed=1):
+    """Build a desktop with Explorer, VS Code/Cursor, browser and unknown windows"""
+    rng = random.Random(seed)
+    folders = []
+    for i in range(20):
+        folder = os.path.join(root, f"project-{i}")
+        os.makedirs(folder, exist_ok=True)
+        folders.append(folder)
+    write_editor_state(os.path.join(root, 'appdata'), folders)
+    processes = {}
+    window_list = []
+    for hwnd in range(1, windows + 1):
+        pid = 1000 + hwnd
+        folder = rng.choice(folders)
+        name = os.path.basename(folder)
+        kind = rng.choice(['explorer', 'vscode', 'cursor', 'browser', 'unknown'])
+        if kind == 'explorer':
+            processes[pid] = FakeProcess(pid, 'explorer.exe', ['explorer.exe'], 'C:\\Windows\\system32')
+            window = FakeWindow(hwnd, kind, pid, f"{name} - File Explorer", 'CabinetWClass', folder)
+        elif kind in ('vscode', 'cursor'):
+            exe, product = ('Code.exe', 'Visual Studio Code') if kind == 'vscode' else ('Cursor.exe', 'Cursor')
+            processes[pid] = FakeProcess(pid, exe, [exe, '--folder-uri', 'file:///' + folder.lstrip('/')], folder)
+            window = FakeWindow(hwnd, kind, pid, f"main.py - {name} - {product}", 'Chrome_WidgetWin_1')
+        elif kind == 'browser':
+            exe = rng.choice(['chrome.exe', 'msedge.exe', 'firefox.exe'])
+            processes[pid] = FakeProcess(pid, exe, [exe], 'C:\\Program Files\\Browser')
+            window = FakeWindow(hwnd, kind, pid, f"owner/{name}: a project · github.com - Browser", 'Chrome_WidgetWin_1')
+        else:
+            processes[pid] = FakeProcess(pid, 'notepad.exe', ['notepad.exe'], rng.choice([folder, 'C:\\Windows\\system32']))
+            window = FakeWindow(hwnd, kind, pid, "notes.txt - Notepad", 'Notepad')
+        window_list.append(window)
+    return FakeDesktop(window_list), processes
+
+
+def fake_launcher(spawned):
+    """GeminiLauncher that appends (argv, cwd) to spawned instead of starting anything"""
+    launcher = hotkey.GeminiLauncher(environ={'PATH': ''}, isfile=lambda path: True)
+    launcher.command = ['gemini']
+    launcher.cache_key = ('', '')
+    launcher.popen = lambda argv, **kwargs: spawned.append((argv, kwargs.get('cwd')))
+    return launcher
+
+
+def fake_app(root, windows=200, seed=1, **options):
+    """GeminiDoubleMiddleClick wired to the in-memory backends; returns (app, desktop, spawned)"""
+    desktop, processes = fake_session(root, windows, seed)
+    spawned = []
+    app = hotkey.GeminiDoubleMiddleClick(
+        desktop=desktop,
+        process_factory=processes.__getitem__,
+        shell_backend=FakeShell(desktop),
+        launcher=fake_launcher(spawned),
+        state_dir=root,
+        appdata_dir=os.path.join(root, 'appdata'),
+        modifiers=FakeModifiers(),
+        **options
+    )
+    app.screenshot_encoder = FakeEncoder()
+    # What the daemon's background refresh has done by the time gestures arrive
+    for index in app.workspaces.values():
+        index.refresh()
+    return app, desktop, spawned
+
+
+def close_app(app):
+    """Stop the app's background threads before its state directory goes away"""
+    app.explorer_shell.stop()
+    app.clone_index.stop()
+    for index in app.workspaces.values():
+        index.stop()
+    app.result_cache.stop()
+    app.prober.stop()
+
+
+def bench_gesture_replay(gestures=5000, windows=200, retitle_rate=0.05):
+    """Replay synthetic gestures through the full click-to-launch path on fake backends"""
+    print(f"\nClick-to-launch replay, {gestures} gestures over {windows} fake windows")
+    rng = random.Random(2)
+    with tempfile.TemporaryDirectory() as root:
+        app, desktop, spawned = fake_app(root, windows)
+        app.explorer_shell.start()
+        latencies = {}
+        started_all = time.perf_counter()
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            for i in range(gestures):
+                window = desktop.windows[rng.choice(desktop.order)]
+                if rng.random() < retitle_rate:
+                    # Title changes (new file, new tab) invalidate cached answers
+                    window.title = window.title.replace("main.py", f"file{i}.py", 1)
+                x, y = desktop.position(window.hwnd)
+                started = time.perf_counter()
+                app.handle_gesture(hotkey.Gesture(x, y, time.time()))
+                latencies.setdefault(window.kind, []).append((time.perf_counter() - started) * 1000)
+        elapsed = time.perf_counter() - started_all
+        close_app(app)
+
+    print(f"  throughput {gestures / elapsed:10,.0f} gestures/s   launches {len(spawned)}")
+    for kind in sorted(latencies):
+        samples = latencies[kind]
+        print(f"  {kind:<10} n={len(samples):<5} p50 {hotkey.percentile(samples, 50):7.3f} ms   "
+              f"p95 {hotkey.percentile(samples, 95):7.3f} ms   p99 {hotkey.percentile(samples, 99):7.3f} ms")
+    print(f"  process cache {app.process_cache.stats()}")
+    print(f"  result cache  {app.result_cache.stats()}")
+
+
+def bench_workspace_index(workspaces=2000, lookups=20000):
+    """Editor workspace index vs probing the search roots for a folder name"""
+    print(f"\nEditor folder lookup, {workspaces} recent workspaces")
+    with tempfile.TemporaryDirectory() as root:
+        folders = [os.path.join(root, 'work', f"project-{i}") for i in range(workspaces)]
+        for folder in folders:
+            os.makedirs(folder)
+        write_editor_state(os.path.join(root, 'appdata'), folders)
+        index = hotkey.EditorWorkspaceIndex(os.path.join(root, 'appdata', 'Code', 'User'))
+        
+        started = time.perf_counter()
+        index.refresh()
+        cold_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        index.refresh()
+        warm_ms = (time.perf_counter() - started) * 1000
+        
+        rng = random.Random(3)
+        names = [os.path.basename(rng.choice(folders)) for _ in range(lookups)]
+        started = time.perf_counter()
+        found = sum(1 for name in names if index.lookup(name))
+        lookup_us = (time.perf_counter() - started) / lookups * 1e6
+        
+        # What the title heuristic does instead: one exists() per search root
+        roots = hotkey.compile_resolver_config({}).editor_roots
+        started = time.perf_counter()
+        for name in names[:1000]:
+            for search_root in roots:
+                if os.path.isdir(os.path.join(search_root, name)):
+                    break
+        probe_us = (time.perf_counter() - started) / 1000 * 1e6
+    
+    print(f"  index build {cold_ms:8.1f} ms   unchanged refresh {warm_ms:6.2f} ms")
+    print(f"  index lookup {lookup_us:7.2f} us   found {found}/{lookups}")
+    print(f"  root probing {probe_us:7.2f} us   ({len(roots)} roots, none of them hold the projects)")
+
+
+def bench_clone_index(clones=500, lookups=20000):
+    """Git clone index vs probing every search root for a repo name"""
+    print(f"\nGitHub page -> local clone, {clones} clones under 3 roots")
+    with tempfile.TemporaryDirectory() as root:
+        roots = [os.path.join(root, name) for name in ('repos', 'GitHub', 'projects')]
+        remotes = []
+        for i in range(clones):
+            # Every fourth clone was renamed locally, so its folder name does not help
+            owner, repo = f"owner{i % 7}", f"repo-{i}"
+            folder = f"{repo}-local" if i % 4 == 0 else repo
+            os.makedirs(os.path.join(roots[i % 3], folder, '.git'))
+            with open(os.path.join(roots[i % 3], folder, '.git', 'config'), 'w', encoding='utf-8') as f:
+                f.write(f'[remote "origin"]\n\turl = https://github.com/{owner}/{repo}.git\n')
+            remotes.append((owner, repo))
+        index = hotkey.GitCloneIndex(lambda: roots, os.path.join(root, 'clone_index.json'))
+        
+        started = time.perf_counter()
+        index.scan()
+        cold_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        index.scan()
+        warm_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        hotkey.GitCloneIndex(lambda: roots, os.path.join(root, 'clone_index.json'))
+        load_ms = (time.perf_counter() - started) * 1000
+        
+        rng = random.Random(4)
+        wanted = [rng.choice(remotes) for _ in range(lookups)]
+        started = time.perf_counter()
+        found = sum(1 for owner, repo in wanted if index.lookup(f"{owner}/{repo}", repo))
+        lookup_us = (time.perf_counter() - started) / lookups * 1e6
+        
+        # The previous approach: join each root with the repo name and check it exists
+        probed = 0
+        started = time.perf_counter()
+        for owner, repo in wanted[:2000]:
+            for search_root in roots:
+                if os.path.isdir(os.path.join(search_root, repo)):
+                    probed += 1
+                    break
+        probe_us = (time.perf_counter() - started) / 2000 * 1e6
+    
+    print(f"  scan cold {cold_ms:8.1f} ms   unchanged rescan {warm_ms:6.1f} ms   load saved {load_ms:6.1f} ms")
+    print(f"  index lookup {lookup_us:7.2f} us   found {found / lookups:6.1%}")
+    print(f"  root probing {probe_us:7.2f} us   found {probed / 2000:6.1%}")
+
+
+class FakeMounts:
+    """stat() over fake volumes: most answer at once, slow ones hang, gone ones fail"""
+
+    def __init__(self, dirs, slow=(), gone=(), delay=0.3):
+        self.dirs = set(dirs)
+        self.slow = set(slow)
+        self.gone = set(gone)
+        self.delay = delay
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        volume = hotkey.volume_of(path)
+        if volume in self.gone:
+            raise OSError(errno.EHOSTDOWN, "Host is down", path)
+        if volume in self.slow:
+            time.sleep(self.delay)
+        if path in self.dirs:
+            return os.stat_result((stat.S_IFDIR | 0o755, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        raise FileNotFoundError(errno.ENOENT, "No such file or directory", path)
+
+
+def bench_path_probing(gestures=10, delay=0.3):
+    """Sequential stat() vs PathProber when search roots sit on a hung and a gone volume"""
+    print(f"\nEditor title lookup, {gestures} gestures, one root on a mount that hangs {delay * 1000:.0f} ms")
+    roots = ['/home/user/source/repos', '/mnt/nas/projects', '/mnt/usb/projects', '/home/user/Desktop',
+             '/mnt/nas/archive', '/home/user/projects']
+    project = '/home/user/projects/widget'
+    candidates = ['widget'] + [os.path.join(root, 'widget') for root in roots]
+
+    mounts = FakeMounts([project], slow=['/mnt/nas'], gone=['/mnt/usb'], delay=delay)
+    sequential = []
+    for _ in range(gestures):
+        started = time.perf_counter()
+        for path in candidates:
+            try:
+                if stat.S_ISDIR(mounts(path).st_mode):
+                    break
+            except OSError:
+                pass
+        sequential.append((time.perf_counter() - started) * 1000)
+
+    mounts = FakeMounts([project], slow=['/mnt/nas'], gone=['/mnt/usb'], delay=delay)
+    prober = hotkey.PathProber(timeout=0.05, fs_stat=mounts)
+    probed = []
+    with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+        for _ in range(gestures):
+            started = time.perf_counter()
+            assert prober.first_dir(candidates) == project
+            probed.append((time.perf_counter() - started) * 1000)
+    prober.stop()
+
+    report('sequential stat', sequential)
+    report('prober (50 ms timeout)', probed)
+    print(f"  first gesture {probed[0]:7.2f} ms, then {hotkey.percentile(probed[1:], 50):6.3f} ms   "
+          f"prober {prober.stats()}")
+
+
+def synthetic_process_table(processes=5000, terminals=20, seed=5):
+    """ProcessRows for a busy desktop: services, browsers and terminals hosting shells"""
+    rng = random.Random(seed)
+    rows = [hotkey.ProcessRow(4, 0, 'system', 1.0)]
+    pid = 100
+    terminal_pids = []
+    for _ in range(terminals):
+        pid += 4
+        created = 1000.0 + pid
+        rows.append(hotkey.ProcessRow(pid, 4, 'windowsterminal.exe', created))
+        terminal_pids.append((pid, created))
+        host = pid
+        pid += 4
+        rows.append(hotkey.ProcessRow(pid, host, 'openconsole.exe', created + 0.1))
+        for tab in range(rng.randint(1, 4)):
+            pid += 4
+            shell = pid
+            rows.append(hotkey.ProcessRow(shell, host, rng.choice(['pwsh.exe', 'cmd.exe', 'bash.exe']),
+                                          created + 1 + tab))
+            if rng.random() < 0.5:
+                # Something running in the shell, e.g. a build
+                pid += 4
+                rows.append(hotkey.ProcessRow(pid, shell, 'node.exe', created + 2 + tab))
+    while len(rows) < processes:
+        pid += 4
+        rows.append(hotkey.ProcessRow(pid, rng.choice(rows).pid, rng.choice(['svchost.exe', 'chrome.exe', 'code.exe']),
+                                      2000.0 + pid))
+    return rows, terminal_pids
+
+
+def bench_process_tree(processes=5000, gestures=500):
+    """Shell under a terminal: one snapshot walked in memory vs a table scan per tree level"""
+    print(f"\nTerminal -> shell lookup, {processes} processes, {gestures} gestures")
+    rows, terminals = synthetic_process_table(processes)
+    shells = hotkey.compile_resolver_config({}).shell_processes
+    rng = random.Random(6)
+    wanted = [rng.choice(terminals) for _ in range(gestures)]
+
+    # psutil's children() reads the whole table each time it is called
+    def children(pid):
+        return [row for row in rows if row.ppid == pid]
+
+    per_level = []
+    answers = []
+    for pid, created in wanted:
+        started = time.perf_counter()
+        newest, level = None, children(pid)
+        while level:
+            for row in level:
+                if row.name in shells and (newest is None or row.create_time > newest.create_time):
+                    newest = row
+            level = [child for row in level for child in children(row.pid)]
+        per_level.append((time.perf_counter() - started) * 1000)
+        answers.append(newest)
+
+    tree = hotkey.ProcessTreeSnapshot(lambda: rows, max_age=0)
+    fresh = []
+    for (pid, created), expected in zip(wanted, answers):
+        started = time.perf_counter()
+        tree.refresh()
+        assert tree.newest_descendant(pid, created, shells) == expected
+        fresh.append((time.perf_counter() - started) * 1000)
+
+    tree.max_age = 2.0
+    reused = []
+    for pid, created in wanted:
+        started = time.perf_counter()
+        tree.refresh()
+        tree.newest_descendant(pid, created, shells)
+        reused.append((time.perf_counter() - started) * 1000)
+
+    report('table scan per level', per_level)
+    report('snapshot per gesture', fresh)
+    report('reused snapshot', reused)
+
+
+STARTUP_PROBE = """
+import sys, time
+started = time.perf_counter()
+import hotkey
+{extra}
+elapsed = time.perf_counter() - started
+rss_mb = float('nan')
+try:
+    # Current RSS; ru_maxrss would include the parent's peak on Linux
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                rss_mb = int(line.split()[1]) / 1024
+except OSError:
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss_mb = rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+    except ImportError:
+        pass
+print(elapsed * 1000, rss_mb)
+"""
+
+
+def bench_startup(runs=5):
+    """Import cost and peak RSS of the daemon module, lean vs eager heavy imports"""
+    print(f"\nDaemon startup, best of {runs} fresh interpreters")
+    here = os.path.dirname(os.path.abspath(__file__))
+    eager = "\n".join(f"try:\n    import {name}\nexcept ImportError:\n    pass"
+                      for name in hotkey.LAZY_MODULES)
+    variants = [
+        ('lazy (current)', ''),
+        ('eager heavy imports', eager),
+    ]
+    for label, extra in variants:
+        best_ms, best_rss = None, None
+        for _ in range(runs):
+            output = subprocess.check_output(
+                [sys.executable, '-c', STARTUP_PROBE.format(extra=extra)], cwd=here, text=True
+            )
+            elapsed_ms, rss_mb = (float(value) for value in output.split()[-2:])
+            best_ms = elapsed_ms if best_ms is None else min(best_ms, elapsed_ms)
+            best_rss = rss_mb if best_rss is None else min(best_rss, rss_mb)
+        print(f"  {label:<22} import {best_ms:7.1f} ms   RSS {best_rss:6.1f} MiB")
+
+    # Per-module breakdown of the lean import, as reported by -X importtime
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import hotkey'],
+                            cwd=here, capture_output=True, text=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            rows.append((int(parts[1]), parts[2].rstrip()))
+    print("  slowest imports (cumulative, -X importtime):")
+    for cumulative, name in sorted(rows, reverse=True)[:8]:
+        print(f"    {cumulative / 1000:7.1f} ms  {name}")
+
+
+class ReplayDesktop:
+    """WindowsDesktop stand-in that shows the window of the recorded gesture being replayed"""
+
+    def __init__(self):
+        self.record = None
+        self.image = Image.new('RGB', (64, 48))
+
+    def window_from_point(self, x, y):
+        return self.record['window'][0]
+
+    def parent(self, hwnd):
+        return 0
+
+    def window_process_id(self, hwnd):
+        return self.record['process'][0]
+
+    def window_text(self, hwnd):
+        return self.record['window'][1]
+
+    def window_class(self, hwnd):
+        return self.record['window'][2]
+
+    def window_rect(self, hwnd):
+        return 0, 0, 64, 48
+
+    def foreground_window(self):
+        return self.record['window'][0]
+
+    def grab(self, bbox):
+        return self.image
+
+    def clipboard_paste(self):
+        return ""
+
+    def clipboard_copy(self, text):
+        pass
+
+    def process(self, pid):
+        """psutil.Process stand-in for the recorded window owner"""
+        pid, create_time, name, cmdline, cwd = self.record['process']
+        return FakeProcess(pid, name, cmdline, cwd, create_time)
+
+
+class ReplayObservations:
+    """Answers the calls listed by observation_points() from a recorded gesture"""
+
+    STAT = {
+        'dir': os.stat_result((stat.S_IFDIR | 0o755,) + (0,) * 9),
+        'file': os.stat_result((stat.S_IFREG | 0o644,) + (0,) * 9),
+    }
+
+    def __init__(self):
+        self.record = None
+        self.unrecorded = {}  # kind -> calls the recording has no answer for
+
+    def answer(self, kind):
+        def call(*args):
+            answers = self.record['observed'].get(kind, {})
+            key = json.dumps(args, default=sorted)
+            if key not in answers:
+                self.unrecorded[kind] = self.unrecorded.get(kind, 0) + 1
+            value = answers.get(key)
+            if kind == 'stat':
+                if value is None:
+                    raise FileNotFoundError(errno.ENOENT, "No such file or directory", args[0])
+                return self.STAT[value]
+            if kind in ('process_tree', 'process_parent'):
+                return hotkey.ProcessRow(*value) if value else None
+            return value
+        return call
+
+
+def replay_recording(path):
+    """Run gestures logged with GEMINI_HOTKEY_RECORD through today's resolvers, offline"""
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records = [record for record in records if record.get('window') and record.get('process')]
+    print(f"\nReplaying {len(records)} recorded gestures from {path}")
+    if not records:
+        return
+
+    desktop = ReplayDesktop()
+    world = ReplayObservations()
+    with tempfile.TemporaryDirectory() as root:
+        app = hotkey.GeminiDoubleMiddleClick(
+            desktop=desktop,
+            process_factory=desktop.process,
+            shell_backend=FakeShell(FakeDesktop([])),
+            launcher=fake_launcher([]),
+            state_dir=root,
+            appdata_dir=root,
+            modifiers=FakeModifiers(),
+        )
+        app.screenshot_encoder = FakeEncoder()
+        for kind, owner, attribute in app.observation_points():
+            setattr(owner, attribute, world.answer(kind))
+        # The recorded rows stand in for the live process table
+        app.process_tree.refresh = lambda force=False: None
+
+        recorded, replayed, changed = {}, {}, []
+        started_all = time.perf_counter()
+        for record in records:
+            if 'config' in record:
+                table = hotkey.compile_resolver_config(record['config'])
+                app.resolver_config.table = table
+                app.apply_resolver_config(table)
+            world.record = desktop.record = record
+            # Resolve from scratch: the recording's cache and speculation state are not replayed
+            app.result_cache.entries.clear()
+            app.process_cache.entries.clear()
+            started = time.perf_counter()
+            with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+                path = app.get_path_from_window(record['x'], record['y'])
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            # Grouped by what answered the gesture when it was recorded
+            replayed.setdefault(record['source'], []).append(elapsed_ms)
+            if 'resolve' in record['stages']:
+                recorded.setdefault(record['source'], []).append(record['stages']['resolve'])
+            if path != record['path']:
+                changed.append((record, app.last_source, path))
+        elapsed = time.perf_counter() - started_all
+        close_app(app)
+
+    print(f"  throughput {len(records) / elapsed:10,.0f} gestures/s")
+    print(f"  {'recorded as':<12} {'n':>5}   {'recorded p50':>12}   {'replay p50':>10}   {'delta':>9}")
+    for source in sorted(replayed):
+        now = hotkey.percentile(replayed[source], 50)
+        then = hotkey.percentile(recorded.get(source, []), 50)
+        print(f"  {source:<12} {len(replayed[source]):>5}   {then:9.3f} ms   {now:7.3f} ms   {now - then:+7.3f} ms")
+    print(f"  changed results: {len(changed)} of {len(records)}")
+    for record, source, path in changed[:10]:
+        print(f"    {record['window'][1][:60]!r}: {record['path']} ({record['source']}) -> {path} ({source})")
+    if world.unrecorded:
+        # Calls the recording has no answer for, e.g. after a cache hit or a resolver change
+        print(f"  unrecorded calls (answered as missing): {world.unrecorded}")
+
+
+BENCHMARKS = {
+    'parallel': bench_parallel_resolution,
+    'screenshot': bench_screenshot_encoding,
+    'store': bench_screenshot_store,
+    'keyboard': bench_keyboard_hook,
+    'events': bench_mouse_event_filter,
+    'replay': bench_gesture_replay,
+    'workspace': bench_workspace_index,
+    'clones': bench_clone_index,
+    'probe': bench_path_probing,
+    'tree': bench_process_tree,
+    'startup': bench_startup,
+}
+
+
+def main():
+    if sys.argv[1:2] == ['--recording']:
+        if len(sys.argv) != 3:
+            print(f"Usage: python {os.path.basename(__file__)} --recording <file.jsonl>")
+            sys.exit(1)
+        replay_recording(sys.argv[2])
+        return
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"Unknown benchmark '{name}'. Available: {', '.join(BENCHMARKS)}")
+            sys.exit(1)
+    print("Gemini Hotkey Benchmarks")
+    print("========================")
+    for name in names:
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
@@ -5,48 +5,2387 @@ Double middle-click any window to launch Gemini in that context
 """
 
 import os
+import re
+import errno
+import hashlib
+import importlib
+import json
+import shutil
+import stat
 import subprocess
-import win32gui
-import win32process
-import win32com.client
-import psutil
-import pythoncom
 import time
 import threading
+import queue
 import sys
-import pyperclip
-from PIL import ImageGrab
-from pynput import mouse, keyboard
+import urllib.parse
+from collections import namedtuple, OrderedDict, deque
+
+# Windows-only modules. They are optional at import time so the helpers below
+# can be exercised with fake backends on other platforms.
+# psutil, pyperclip, PIL.ImageGrab and win32com are imported where they are
+# used (and pre-warmed once the hook is live), so the daemon starts listening
+# without paying for them; see prewarm_imports().
+try:
+    import win32api
+    import win32gui
+    import win32process
+except ImportError:
+    win32api = win32gui = win32process = None
+
+try:
+    from pynput import mouse
+except ImportError:
+    mouse = None
+
+# Resolver settings; resolver_config.json in the state directory overrides
+# any of these keys and is picked up without restarting the daemon
+DEFAULT_RESOLVER_CONFIG = {
+    # Process names the editor and browser resolvers are registered for
+    'editor_processes': ['code.exe', 'cursor.exe', 'sublime_text.exe'],
+    'browser_processes': ['chrome.exe', 'firefox.exe', 'msedge.exe', 'brave.exe', 'opera.exe', 'vivaldi.exe'],
+    # A process cwd containing any of these is not a useful answer
+    'system_dirs': ['system32', 'windows', 'program files', 'appdata'],
+    # Where a folder named in an Explorer title is looked up
+    'explorer_roots': ['~', '~\\Desktop', '~\\Documents', '~\\Downloads', 'C:\\', 'D:\\'],
+    # Where project folders named in editor titles and GitHub pages are looked up
+    'project_roots': ['~\\source\\repos', '~\\Documents\\GitHub', '~\\Documents', '~\\Desktop',
+                      'C:\\projects', 'D:\\projects'],
+    # Terminal hosts whose own cwd says nothing, and the shells that run inside them
+    'terminal_processes': ['windowsterminal.exe', 'openconsole.exe', 'conhost.exe', 'wezterm-gui.exe',
+                           'alacritty.exe', 'mintty.exe'],
+    'shell_processes': ['cmd.exe', 'powershell.exe', 'pwsh.exe', 'bash.exe', 'zsh.exe', 'fish.exe', 'nu.exe'],
+    # "file - folder - <editor>" window title endings
+    'editor_title_suffixes': [' - Cursor', ' - Visual Studio Code'],
+    # Drive path embedded in a window title, e.g. "C:\work\notes.txt - Notepad"; group 1 is the path
+    'title_patterns': [r'([A-Z]:\\[^<>:"|*?\[\]]+?)(?:\s|$|"|\'|-)'],
+}
+
+# Editors that keep their recent workspaces under %APPDATA%\<dir>\User
+EDITOR_STATE_DIRS = {'code.exe': 'Code', 'cursor.exe': 'Cursor'}
+
+# owner and repo of a GitHub remote in .git/config, https or ssh form
+GITHUB_REMOTE_RE = re.compile(r'github\.com[:/]+([\w.-]+)/([\w.-]+?)(?:\.git)?/*$', re.IGNORECASE)
+
+# DEFAULT_RESOLVER_CONFIG compiled for lookups, see compile_resolver_config()
+ResolverTable = namedtuple('ResolverTable', [
+    'editor_processes', 'browser_processes', 'terminal_processes', 'shell_processes',
+    'system_dirs', 'explorer_roots',
+    'project_roots', 'clone_roots', 'editor_roots', 'editor_title_suffixes', 'title_patterns',
+])
+
+
+def normalize_roots(roots):
+    """Expand ~ and %VARS% and drop duplicates, keeping the order"""
+    seen = OrderedDict()
+    for root in roots:
+        seen.setdefault(os.path.normpath(os.path.expandvars(os.path.expanduser(root))), None)
+    return tuple(seen)
+
+
+def file_uri_to_path(uri):
+    """Convert a file:/// URI to a local path, or None for other schemes"""
+    if not uri.startswith('file:///'):
+        return None
+    path = urllib.parse.unquote(uri[8:])
+    if len(path) > 1 and path[1] == ':':
+        # "c:/Users/..." -> "C:\Users\..."
+        return os.path.normpath(path[0].upper() + path[1:]).replace('/', '\\')
+    return os.path.normpath('/' + path)
+
+
+def compile_resolver_config(overrides):
+    """Merge overrides onto the defaults and compile them; raises ValueError if malformed"""
+    if not isinstance(overrides, dict):
+        raise ValueError("resolver config must be a JSON object")
+    unknown = set(overrides) - set(DEFAULT_RESOLVER_CONFIG)
+    if unknown:
+        raise ValueError(f"unknown resolver config keys: {', '.join(sorted(unknown))}")
+    config = dict(DEFAULT_RESOLVER_CONFIG, **overrides)
+    for key, value in config.items():
+        if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+            raise ValueError(f"'{key}' must be a list of strings")
+    
+    try:
+        title_patterns = tuple(re.compile(pattern) for pattern in config['title_patterns'])
+    except re.error as e:
+        raise ValueError(f"bad title pattern: {e}") from e
+    if any(pattern.groups < 1 for pattern in title_patterns):
+        raise ValueError("title patterns must capture the path in group 1")
+    system_dirs = None
+    if config['system_dirs']:
+        system_dirs = re.compile('|'.join(re.escape(d.lower()) for d in config['system_dirs']))
+    
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    project_roots = normalize_roots([script_dir, os.getcwd()] + config['project_roots'])
+    # Editors also look in every parent of the script directory
+    parents = []
+    parent = os.path.dirname(script_dir)
+    while parent and parent != os.path.dirname(parent):
+        parents.append(parent)
+        parent = os.path.dirname(parent)
+    
+    return ResolverTable(
+        editor_processes=frozenset(name.lower() for name in config['editor_processes']),
+        browser_processes=frozenset(name.lower() for name in config['browser_processes']),
+        terminal_processes=frozenset(name.lower() for name in config['terminal_processes']),
+        shell_processes=frozenset(name.lower() for name in config['shell_processes']),
+        system_dirs=system_dirs,
+        explorer_roots=normalize_roots(config['explorer_roots']),
+        project_roots=project_roots,
+        # Crawled in the background, so only the configured folders: the daemon's
+        # cwd is often C:\Windows\System32 when started from the Run key
+        clone_roots=normalize_roots(config['project_roots']),
+        editor_roots=normalize_roots(project_roots + tuple(parents)),
+        editor_title_suffixes=tuple(config['editor_title_suffixes']),
+        title_patterns=title_patterns,
+    )
+
+# Everything a resolver gets to look at for one gesture
+WindowContext = namedtuple('WindowContext', ['hwnd', 'process', 'process_name', 'title', 'window_class'])
+
+# A recorded Shift + double middle-click, handed from the hook thread to the worker.
+# Speculative gestures are first clicks that get resolved ahead of the second one.
+Gesture = namedtuple('Gesture', ['x', 'y', 'time', 'speculative'], defaults=(False,))
+
+# Result of resolving the window under a first click; resolved is False when
+# the path came from the result cache rather than from running resolvers
+Speculation = namedtuple('Speculation', ['x', 'y', 'time', 'key', 'title', 'window_class', 'path', 'resolved'])
+
+
+# Imported on first use rather than at startup
+LAZY_MODULES = ('psutil', 'pyperclip', 'PIL.ImageGrab', 'win32com.client')
+
+
+def prewarm_imports():
+    """Import the lazily loaded modules now, e.g. from a background thread"""
+    for name in LAZY_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            pass
+
+
+# Low-level mouse hook message for a middle-button press
+WM_MBUTTONDOWN = 0x0207
+
+
+def middle_button_filter(msg, data):
+    """pynput win32_event_filter: only middle-button presses reach on_click
+
+    Runs first thing in the hook, so the constant stream of moves, wheel and
+    other button events is dropped before pynput translates and dispatches it.
+    """
+    return msg == WM_MBUTTONDOWN
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class NullSpan:
+    """What Tracer.span() returns while tracing is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class TraceSpan:
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+class Tracer:
+    """In-memory ring buffer of per-gesture timing spans
+
+    Spans are (gesture id, stage name, start time, seconds). With tracing
+    off, span() returns a shared no-op context manager and record() returns
+    straight away, so instrumented code pays one attribute check.
+    """
+
+    def __init__(self, enabled=False, capacity=4096):
+        self.enabled = enabled
+        self.spans = deque(maxlen=capacity)
+        self.gesture = 0  # id of the gesture being handled
+
+    def span(self, name):
+        """Context manager timing one stage of the current gesture"""
+        if not self.enabled:
+            return NULL_SPAN
+        return TraceSpan(self, name)
+
+    def record(self, name, seconds, gesture=None):
+        """Record a stage that took seconds and has just finished"""
+        if not self.enabled:
+            return
+        if gesture is None:
+            gesture = self.gesture
+        self.spans.append((gesture, name, time.time() - seconds, seconds))
+
+    def histograms(self):
+        """Return {stage: {count, p50_ms, p95_ms, p99_ms, max_ms}} over the buffered spans"""
+        durations = {}
+        for _, name, _, seconds in list(self.spans):
+            durations.setdefault(name, []).append(seconds * 1000)
+        return {
+            name: {
+                'count': len(samples),
+                'p50_ms': percentile(samples, 50),
+                'p95_ms': percentile(samples, 95),
+                'p99_ms': percentile(samples, 99),
+                'max_ms': max(samples),
+            }
+            for name, samples in durations.items()
+        }
+
+    def export_jsonl(self, path):
+        """Write the buffered spans as JSON lines; returns how many were written"""
+        spans = list(self.spans)
+        with open(path, 'w', encoding='utf-8') as f:
+            for gesture, name, started, seconds in spans:
+                f.write(json.dumps({'gesture': gesture, 'stage': name, 'ts': round(started, 6),
+                                    'ms': round(seconds * 1000, 3)}) + "\n")
+        return len(spans)
+
+
+class WindowsDesktop:
+    """The window, screen and clipboard calls the daemon makes
+
+    Everything the resolution path needs from the desktop goes through one
+    of these methods, so an in-memory fake (see benchmark.py) can replace
+    the whole Windows session.
+    """
+
+    def window_from_point(self, x, y):
+        return win32gui.WindowFromPoint((x, y))
+
+    def parent(self, hwnd):
+        return win32gui.GetParent(hwnd)
+
+    def window_process_id(self, hwnd):
+        _, pid = win32process.GetWindowThreadProcessId(hwnd)
+        return pid
+
+    def window_text(self, hwnd):
+        return win32gui.GetWindowText(hwnd)
+
+    def window_class(self, hwnd):
+        return win32gui.GetClassName(hwnd)
+
+    def window_rect(self, hwnd):
+        return win32gui.GetWindowRect(hwnd)
+
+    def foreground_window(self):
+        return win32gui.GetForegroundWindow()
+
+    def grab(self, bbox):
+        """Screenshot of a screen rectangle as a PIL image"""
+        from PIL import ImageGrab
+        return ImageGrab.grab(bbox=bbox)
+
+    def clipboard_paste(self):
+        import pyperclip
+        return pyperclip.paste()
+
+    def clipboard_copy(self, text):
+        import pyperclip
+        pyperclip.copy(text)
+
+
+class KeyStateModifiers:
+    """Reads modifier state on demand with GetAsyncKeyState
+
+    Replaces a global keyboard hook: nothing runs per keystroke, the state is
+    only sampled when a middle-click arrives. A fake with the same
+    shift_pressed() can be used in its place.
+    """
+
+    VK_SHIFT = 0x10
+
+    def shift_pressed(self):
+        # High bit set means the key is down right now
+        return bool(win32api.GetAsyncKeyState(self.VK_SHIFT) & 0x8000)
+
+
+class GesturePipeline:
+    """Bounded queue and worker thread that handle gestures off the mouse hook thread
+
+    The hook callback must return quickly or Windows may silently unhook it, so
+    submit() never blocks: repeated gestures in a burst are coalesced and, when
+    the queue is full, new gestures are dropped instead of piling up threads.
+    """
+
+    def __init__(self, handler, maxsize=4, coalesce_window=1.0, coalesce_distance=16):
+        self.handler = handler
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.coalesce_window = coalesce_window  # seconds
+        self.coalesce_distance = coalesce_distance  # pixels
+        self.last_accepted = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.handled = 0
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="gesture-worker", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=2.0):
+        """Ask the worker to exit once the queued gestures are handled"""
+        if self._thread is None:
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout=timeout)
+        self._thread = None
+
+    def submit(self, gesture):
+        """Enqueue a gesture without blocking; returns False if it was coalesced or dropped"""
+        self.submitted += 1
+        last = self.last_accepted
+        if (not gesture.speculative
+                and last is not None
+                and gesture.time - last.time < self.coalesce_window
+                and abs(gesture.x - last.x) <= self.coalesce_distance
+                and abs(gesture.y - last.y) <= self.coalesce_distance):
+            self.coalesced += 1
+            return False
+        try:
+            self.queue.put_nowait(gesture)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if not gesture.speculative:
+            self.last_accepted = gesture
+        return True
+
+    def stats(self):
+        """Return the pipeline counters"""
+        return {
+            'submitted': self.submitted,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'handled': self.handled,
+            'queued': self.queue.qsize(),
+        }
+
+    def _run(self):
+        while True:
+            gesture = self.queue.get()
+            if gesture is None:
+                break
+            try:
+                self.handler(gesture)
+            except Exception as e:
+                print(f"Gesture handler error: {e}")
+            self.handled += 1
+
+
+# Snapshot of the process fields the resolvers need
+ProcessInfo = namedtuple('ProcessInfo', ['pid', 'create_time', 'name', 'cmdline', 'cwd'])
+
+
+class ProcessInfoCache:
+    """LRU + TTL cache of ProcessInfo keyed by (pid, create_time)
+
+    The create time makes the key safe against PID reuse. On a miss all
+    fields are read inside a single psutil oneshot() block.
+    """
+
+    def __init__(self, maxsize=64, ttl=30.0, process_factory=None):
+        self.process_factory = process_factory  # pid -> psutil.Process-like object
+        self.maxsize = maxsize
+        self.ttl = ttl  # seconds; cwd can change meanwhile, resolvers use current_cwd()
+        self.entries = OrderedDict()  # (pid, create_time) -> (fetched_at, ProcessInfo)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, pid):
+        """Return ProcessInfo for pid (raises psutil.NoSuchProcess if it is gone)"""
+        factory = self.process_factory
+        if factory is None:
+            import psutil
+            factory = self.process_factory = psutil.Process
+        process = factory(pid)
+        key = (pid, process.create_time())
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and now - entry[0] < self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        
+        info = self._fetch(process, key[1])
+        with self.lock:
+            self.entries[key] = (now, info)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        return info
+
+    def stats(self):
+        """Return the cache counters"""
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+            }
+
+    def _fetch(self, process, create_time):
+        import psutil
+        with process.oneshot():
+            name = process.name()
+            try:
+                cmdline = process.cmdline()
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                cmdline = []
+            try:
+                cwd = process.cwd()
+            except (psutil.AccessDenied, psutil.ZombieProcess):
+                cwd = None
+        return ProcessInfo(process.pid, create_time, name, cmdline, cwd)
+
+    def current_cwd(self, pid, create_time):
+        """Read a process's working directory now, bypassing the cache; None if gone or denied"""
+        import psutil
+        factory = self.process_factory or psutil.Process
+        try:
+            process = factory(pid)
+            if process.create_time() != create_time:
+                return None  # PID reused
+            return process.cwd()
+        except (psutil.Error, OSError):
+            return None
+
+
+# One row of a ProcessTreeSnapshot; name is lowercased
+ProcessRow = namedtuple('ProcessRow', ['pid', 'ppid', 'name', 'create_time'])
+
+
+def psutil_process_rows():
+    """Every process as a ProcessRow, read in a single psutil pass"""
+    import psutil
+    for process in psutil.process_iter(['pid', 'ppid', 'name', 'create_time']):
+        info = process.info
+        yield ProcessRow(info['pid'], info['ppid'], (info['name'] or '').lower(), info['create_time'] or 0.0)
+
+
+class ProcessTreeSnapshot:
+    """Parent -> children table of all processes, taken in one pass and reused briefly
+
+    Terminal windows belong to a host process whose own cwd is useless; the
+    directory that matters is that of the shell running inside it. Rather
+    than asking psutil for children level by level, the whole table is read
+    once (at most every max_age seconds) and walked in memory. A child that
+    is older than its supposed parent is ignored, since its PPID was reused.
+    """
+
+    def __init__(self, source=None, max_age=2.0):
+        self.source = source or psutil_process_rows  # () -> iterable of ProcessRow
+        self.max_age = max_age
+        self.rows = {}  # pid -> ProcessRow
+        self.children = {}  # ppid -> [ProcessRow]
+        self.taken_at = None
+        self.snapshots = 0
+        self.reuses = 0
+        self.lock = threading.Lock()
+
+    def refresh(self, force=False):
+        """Take a new snapshot unless the current one is recent enough"""
+        with self.lock:
+            now = time.monotonic()
+            if not force and self.taken_at is not None and now - self.taken_at < self.max_age:
+                self.reuses += 1
+                return
+            rows, children = {}, {}
+            for row in self.source():
+                rows[row.pid] = row
+                children.setdefault(row.ppid, []).append(row)
+            self.rows, self.children = rows, children
+            self.taken_at = now
+            self.snapshots += 1
+
+    def parent(self, pid):
+        """ProcessRow of pid's parent, or None"""
+        row = self.rows.get(pid)
+        if row is None:
+            return None
+        parent = self.rows.get(row.ppid)
+        if parent is None or parent.create_time > row.create_time:
+            return None
+        return parent
+
+    def newest_descendant(self, pid, create_time, names):
+        """Most recently started process below pid (any depth) whose name is in names"""
+        newest = None
+        seen = {pid}
+        stack = [(pid, create_time)]
+        while stack:
+            parent_pid, parent_created = stack.pop()
+            for child in self.children.get(parent_pid, ()):
+                if child.pid in seen or child.create_time < parent_created:
+                    continue
+                seen.add(child.pid)
+                if child.name in names and (newest is None or child.create_time > newest.create_time):
+                    newest = child
+                stack.append((child.pid, child.create_time))
+        return newest
+
+    def stats(self):
+        with self.lock:
+            return {'snapshots': self.snapshots, 'reuses': self.reuses, 'processes': len(self.rows)}
+
+
+# One registered resolver; see ResolverRegistry.register
+ResolverEntry = namedtuple('ResolverEntry', ['priority', 'func', 'processes', 'classes', 'cacheable', 'concurrent'])
+
+
+def volume_of(path):
+    """Drive letter, UNC share or (POSIX) top two directories a path lives on"""
+    drive, _ = os.path.splitdrive(path)
+    if drive:
+        return drive.lower()
+    if not os.path.isabs(path):
+        return ''
+    return os.sep.join(path.split(os.sep)[:3])
+
+
+# Errors that mean the volume itself is unreachable rather than the path missing.
+# CPython maps several of the Windows ones to FileNotFoundError or
+# PermissionError, so the codes are checked, not the exception class.
+VOLUME_DOWN_WINERRORS = frozenset((
+    15,    # ERROR_INVALID_DRIVE
+    21,    # ERROR_NOT_READY
+    51,    # ERROR_REM_NOT_LIST
+    53,    # ERROR_BAD_NETPATH
+    55,    # ERROR_DEV_NOT_EXIST
+    59,    # ERROR_UNEXP_NET_ERR
+    64,    # ERROR_NETNAME_DELETED
+    67,    # ERROR_BAD_NET_NAME
+    121,   # ERROR_SEM_TIMEOUT
+    1167,  # ERROR_DEVICE_NOT_CONNECTED
+    1222,  # ERROR_NO_NETWORK
+    1231,  # ERROR_NETWORK_UNREACHABLE
+    1232,  # ERROR_HOST_UNREACHABLE
+))
+VOLUME_DOWN_ERRNOS = frozenset(getattr(errno, name) for name in (
+    'EHOSTDOWN', 'EHOSTUNREACH', 'ENETDOWN', 'ENETUNREACH', 'ETIMEDOUT',
+    'EIO', 'ENXIO', 'ENODEV', 'ESTALE', 'ENOMEDIUM',
+) if hasattr(errno, name))
+
+
+def volume_down(error):
+    """True if an OSError from stat() says the whole volume is unreachable"""
+    winerror = getattr(error, 'winerror', None)
+    if winerror is not None:
+        return winerror in VOLUME_DOWN_WINERRORS
+    return error.errno in VOLUME_DOWN_ERRNOS
+
+
+class PathProber:
+    """Existence checks that cannot stall a gesture on a slow or missing volume
+
+    Each stat runs on a small thread pool and is abandoned after timeout
+    seconds. A volume whose stat timed out or failed with an error that
+    means the volume is down (see volume_down()) is skipped for negative_ttl
+    seconds, so a disconnected share or sleeping drive costs one timeout
+    rather than one per probe. Any other error only misses that path.
+    first_dir() probes a whole candidate list in one concurrent pass.
+    """
+
+    def __init__(self, timeout=0.2, negative_ttl=30.0, workers=8, fs_stat=None):
+        self.fs_stat = fs_stat or os.stat  # path -> os.stat_result-like, raises OSError
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.workers = workers
+        self.unreachable = {}  # volume -> time.monotonic() it may be probed again
+        self.probes = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def stat(self, path):
+        """Return the stat result for path, or None if missing, unreachable or too slow"""
+        return self.stat_all([path])[0]
+
+    def exists(self, path):
+        return bool(path) and self.stat(path) is not None
+
+    def isdir(self, path):
+        result = self.stat(path) if path else None
+        return result is not None and stat.S_ISDIR(result.st_mode)
+
+    def first_dir(self, paths):
+        """Return the first of paths that is a directory, probing them all at once"""
+        paths = [path for path in dict.fromkeys(paths) if path]
+        for path, result in zip(paths, self.stat_all(paths, first_dir=True)):
+            if result is not None and stat.S_ISDIR(result.st_mode):
+                return path
+        return None
+
+    def stat_all(self, paths, first_dir=False):
+        """Stat paths concurrently under one shared deadline; None where a probe failed
+
+        With first_dir=True collection stops at the first directory, the
+        remaining results are reported as None.
+        """
+        import concurrent.futures
+        now = time.monotonic()
+        futures = []
+        with self.lock:
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="probe"
+                )
+            for path in paths:
+                volume = volume_of(path)
+                if self.unreachable.get(volume, 0.0) > now:
+                    self.skipped += 1
+                    futures.append(None)
+                else:
+                    self.probes += 1
+                    futures.append(self.executor.submit(self._stat, path, volume))
+        
+        expires = now + self.timeout
+        results = [None] * len(paths)
+        for i, (path, future) in enumerate(zip(paths, futures)):
+            if future is None:
+                continue
+            try:
+                results[i] = future.result(timeout=max(0.0, expires - time.monotonic()))
+            except concurrent.futures.TimeoutError:
+                # Still queued means the pool is busy, not that the volume is slow
+                if future.running():
+                    self._mark_unreachable(volume_of(path))
+                    with self.lock:
+                        self.timeouts += 1
+                continue
+            if first_dir and results[i] is not None and stat.S_ISDIR(results[i].st_mode):
+                break
+        for future in futures:
+            if future is not None:
+                future.cancel()
+        return results
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            return {
+                'probes': self.probes,
+                'timeouts': self.timeouts,
+                'skipped': self.skipped,
+                'unreachable': sorted(volume for volume, until in self.unreachable.items() if until > now),
+            }
+
+    def _stat(self, path, volume):
+        try:
+            return self.fs_stat(path)
+        except ValueError:
+            return None
+        except OSError as e:
+            # Network name gone, device not ready...; anything else is a miss for this path only
+            if volume_down(e):
+                self._mark_unreachable(volume)
+            return None
+
+    def _mark_unreachable(self, volume):
+        if not volume:
+            return
+        now = time.monotonic()
+        with self.lock:
+            already = self.unreachable.get(volume, 0.0) > now
+            self.unreachable[volume] = now + self.negative_ttl
+        if not already:
+            print(f"⚠ Not probing {volume} for {self.negative_ttl:.0f}s, it is unreachable or slow")
+
+
+class ResolverRegistry:
+    """Table of path resolvers dispatched on process name and window class
+
+    Resolvers are registered for a set of process names and/or window
+    classes, or as fallbacks that apply to every window. The ordered chain
+    for a (process name, window class) pair is built once and then served
+    from a dict, each resolver runs at most once per gesture and the first
+    one that returns a path wins.
+    """
+
+    def __init__(self, tracer=None):
+        self.tracer = tracer
+        self.entries = {}  # name -> ResolverEntry
+        self.by_process = {}  # process name -> [resolver names]
+        self.by_class = {}  # window class -> [resolver names]
+        self.fallbacks = []
+        self.chains = {}  # (process name, window class) -> ordered resolver names
+        self.timings = {}  # name -> [calls, hits, total seconds, max seconds]
+        self.deadline_misses = 0
+        self.lock = threading.Lock()
+
+    def register(self, name, func, priority, processes=(), classes=(), fallback=False,
+                 cacheable=True, concurrent=True):
+        """Register a resolver; func(ctx) returns a directory or None
+
+        Resolvers with side effects (e.g. taking a screenshot) should pass
+        concurrent=False so resolve_parallel() only runs them once every
+        higher-priority resolver has come back empty.
+        """
+        processes = frozenset(processes)
+        classes = frozenset(classes)
+        self.entries[name] = ResolverEntry(priority, func, processes, classes, cacheable, concurrent)
+        if fallback:
+            self.fallbacks.append(name)
+        elif processes:
+            for process_name in processes:
+                self.by_process.setdefault(process_name, []).append(name)
+        else:
+            for window_class in classes:
+                self.by_class.setdefault(window_class, []).append(name)
+        self.timings[name] = [0, 0, 0.0, 0.0]
+        self.chains.clear()
+
+    def reroute(self, processes):
+        """Swap the process names resolvers are registered for, given {name: processes}
+
+        The new routing is built aside and swapped in with a few assignments,
+        so a gesture resolving concurrently sees either the old or the new table.
+        """
+        entries = dict(self.entries)
+        for name, names in processes.items():
+            entries[name] = entries[name]._replace(processes=frozenset(names))
+        by_process = {}
+        for name, entry in entries.items():
+            if name not in self.fallbacks:
+                for process_name in entry.processes:
+                    by_process.setdefault(process_name, []).append(name)
+        self.entries = entries
+        self.by_process = by_process
+        self.chains = {}
+
+    def chain(self, process_name, window_class):
+        """Return the ordered resolver names that apply to a window"""
+        key = (process_name, window_class)
+        chain = self.chains.get(key)
+        if chain is None:
+            names = set(self.fallbacks)
+            names.update(self.by_process.get(process_name, ()))
+            names.update(self.by_class.get(window_class, ()))
+            # A resolver registered for both processes and classes needs both to match
+            names = [name for name in names
+                     if not self.entries[name].classes or window_class in self.entries[name].classes]
+            chain = tuple(sorted(names, key=lambda name: self.entries[name].priority))
+            self.chains[key] = chain
+        return chain
+
+    def resolve(self, ctx, speculative=False):
+        """Run the chain for ctx in order; returns (resolver name, path) or (None, None)
+
+        With speculative=True the chain stops before the first non-concurrent
+        (side-effecting) resolver, so an abandoned speculation leaves nothing behind.
+        """
+        for name in self.chain(ctx.process_name, ctx.window_class):
+            if speculative and not self.entries[name].concurrent:
+                break
+            path = self._call(name, ctx)
+            if path:
+                return name, path
+        return None, None
+
+    def resolve_parallel(self, ctx, executor, deadline, speculative=False):
+        """Run the concurrent resolvers for ctx on executor under a deadline (seconds)
+
+        Returns the highest-priority answer available when the deadline hits;
+        resolvers still running then are ignored. Non-concurrent resolvers run
+        inline, in priority order, only if nothing ranked above them answered.
+        """
+        import concurrent.futures
+        chain = self.chain(ctx.process_name, ctx.window_class)
+        futures = {
+            name: executor.submit(self._call, name, ctx)
+            for name in chain if self.entries[name].concurrent
+        }
+        expires = time.monotonic() + deadline
+        result = (None, None)
+        for name in chain:
+            future = futures.get(name)
+            if future is None:
+                if speculative:
+                    break
+                path = self._call(name, ctx)
+            else:
+                try:
+                    path = future.result(timeout=max(0.0, expires - time.monotonic()))
+                except concurrent.futures.TimeoutError:
+                    with self.lock:
+                        self.deadline_misses += 1
+                    continue
+            if path:
+                result = (name, path)
+                break
+        # Stragglers that have not started yet are dropped, running ones are ignored
+        for future in futures.values():
+            future.cancel()
+        return result
+
+    def is_cacheable(self, name):
+        return name in self.entries and self.entries[name].cacheable
+
+    def stats(self):
+        """Per-resolver call counts and timings (milliseconds) for profiling"""
+        with self.lock:
+            return {
+                name: {
+                    'calls': calls,
+                    'hits': hits,
+                    'avg_ms': (total / calls * 1000) if calls else 0.0,
+                    'max_ms': longest * 1000,
+                }
+                for name, (calls, hits, total, longest) in self.timings.items()
+            }
+
+    def _call(self, name, ctx):
+        started = time.perf_counter()
+        try:
+            path = self.entries[name].func(ctx)
+        except Exception as e:
+            print(f"Resolver '{name}' failed: {e}")
+            path = None
+        elapsed = time.perf_counter() - started
+        if self.tracer is not None:
+            self.tracer.record('resolver.' + name, elapsed)
+        with self.lock:
+            timing = self.timings[name]
+            timing[0] += 1
+            timing[2] += elapsed
+            timing[3] = max(timing[3], elapsed)
+            if path:
+                timing[1] += 1
+        return path
+
+
+class ResolverConfig:
+    """Resolver settings file, recompiled when its mtime changes
+
+    current() stats the file at most once per check_interval and swaps in a
+    freshly compiled ResolverTable when it changed, so gestures in flight
+    keep the table they started with. A file that fails to load or compile
+    keeps the previous table; a missing file means the defaults.
+    """
+
+    def __init__(self, path, check_interval=1.0, on_change=None):
+        self.path = path
+        self.check_interval = check_interval
+        self.on_change = on_change
+        self.table = compile_resolver_config({})
+        self.overrides = {}  # what the current table was compiled from
+        self.mtime = None
+        self.next_check = 0.0
+        self.reloads = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def current(self):
+        """Return the compiled table, reloading the file first if it changed"""
+        now = time.monotonic()
+        if now >= self.next_check:
+            self.next_check = now + self.check_interval
+            self.refresh()
+        return self.table
+
+    def refresh(self):
+        """Reload the file if its mtime changed; returns True if a new table was swapped in"""
+        with self.lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if mtime == self.mtime:
+                return False
+            self.mtime = mtime
+            try:
+                overrides = {}
+                if mtime is not None:
+                    with open(self.path, encoding='utf-8') as f:
+                        overrides = json.load(f)
+                table = compile_resolver_config(overrides)
+            except (OSError, ValueError) as e:
+                self.errors += 1
+                print(f"✗ Keeping previous resolver config, {self.path} is invalid: {e}")
+                return False
+            self.table = table
+            self.overrides = overrides
+            self.reloads += 1
+        if mtime is not None:
+            print(f"✓ Loaded resolver config: {self.path}")
+        if self.on_change is not None:
+            self.on_change(table)
+        return True
+
+    def stats(self):
+        return {'reloads': self.reloads, 'errors': self.errors}
+
+
+class ResolutionCache:
+    """LRU cache of resolved directories keyed by window identity, persisted as JSON
+
+    Keys are (hwnd, pid, create_time); the window title and class are stored
+    with each entry and a lookup with a different title drops the entry, as
+    does a directory that no longer exists. put() only marks the cache
+    dirty; a background thread writes it at most once per save_delay.
+    """
+
+    def __init__(self, path=None, maxsize=128, isdir=os.path.isdir, save_delay=2.0):
+        self.path = path
+        self.maxsize = maxsize
+        self.isdir = isdir
+        self.save_delay = save_delay  # seconds
+        self.entries = OrderedDict()  # key -> (title, class, directory)
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()  # one writer of the .tmp file at a time
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.load()
+
+    def get(self, key, title, window_class):
+        """Return the cached directory for a window, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != title or entry[1] != window_class or not self.isdir(entry[2]):
+                del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, title, window_class, directory):
+        with self.lock:
+            self.entries[key] = (title, window_class, directory)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        if not self.path:
+            return
+        # Written from the saver thread, never on the click path
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cache-saver", daemon=True)
+            self._thread.start()
+        self._dirty.set()
+
+    def stop(self):
+        """Stop the saver thread, writing pending changes first"""
+        self._stop.set()
+        self._dirty.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+
+    def stats(self):
+        """Return the cache counters"""
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+    def load(self):
+        """Load entries saved by a previous run; a missing or bad file means an empty cache"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+            for hwnd, pid, create_time, title, window_class, directory in rows:
+                self.entries[(hwnd, pid, create_time)] = (title, window_class, directory)
+        except (OSError, ValueError, TypeError):
+            self.entries.clear()
+
+    def save(self):
+        """Write the entries atomically so a crash never leaves a half-written file"""
+        if not self.path:
+            return
+        with self.save_lock:
+            with self.lock:
+                rows = [list(key) + list(entry) for key, entry in self.entries.items()]
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(rows, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not save resolution cache: {e}")
+
+    def _run(self):
+        while True:
+            self._dirty.wait()
+            # Let a burst of puts settle into one write
+            self._stop.wait(self.save_delay)
+            self._dirty.clear()
+            self.save()
+            if self._stop.is_set():
+                break
+
+
+class EditorWorkspaceIndex:
+    """Folder name -> path of the workspaces an editor has opened recently
+
+    Read from the editor's own state under its User directory: the folders
+    of open windows in globalStorage/storage.json and one workspace.json per
+    workspace under workspaceStorage. A background thread calls refresh()
+    every check_interval seconds, which only re-reads files whose mtime
+    changed and lists workspaceStorage only when the directory itself
+    changed, so a lookup is a dict access. When two workspaces share a name
+    the most recently used wins.
+    """
+
+    def __init__(self, user_dir, check_interval=2.0):
+        self.user_dir = user_dir
+        self.check_interval = check_interval
+        self.files = {}  # state file -> (mtime, [(name, path)])
+        self.storage_mtime = None  # of the workspaceStorage directory
+        self.names = {}  # lowercased folder name -> path
+        self.rebuilds = 0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="workspace-index", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def lookup(self, name):
+        """Return the path of the workspace folder called name, or None"""
+        path = self.names.get(name.strip().lower())
+        if path is None:
+            # Possibly opened since the last refresh
+            self._wake.set()
+        return path
+
+    def refresh(self):
+        """Re-read changed state files; returns True if the index was rebuilt"""
+        with self.lock:
+            changed = self._scan_file(os.path.join(self.user_dir, 'globalStorage', 'storage.json'))
+            storage = os.path.join(self.user_dir, 'workspaceStorage')
+            try:
+                storage_mtime = os.stat(storage).st_mtime_ns
+            except OSError:
+                storage_mtime = None
+            if storage_mtime != self.storage_mtime:
+                # Workspaces were added or removed; pick up the new ones, drop the gone ones
+                self.storage_mtime = storage_mtime
+                try:
+                    current = {os.path.join(storage, entry, 'workspace.json') for entry in os.listdir(storage)}
+                except OSError:
+                    current = set()
+                for path in [path for path in self.files if path.startswith(storage) and path not in current]:
+                    del self.files[path]
+                    changed = True
+                for path in current:
+                    if path not in self.files:
+                        changed = self._scan_file(path) or changed
+            if not changed:
+                return False
+            
+            names = {}
+            # Oldest first, so the most recently written state file wins
+            for mtime, workspaces in sorted(self.files.values(), key=lambda entry: entry[0]):
+                for name, path in workspaces:
+                    names[name] = path
+            self.names = names
+            self.rebuilds += 1
+            return True
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Workspace index refresh failed: {e}")
+            self._wake.wait(self.check_interval)
+            self._wake.clear()
+
+    def _scan_file(self, path):
+        """Re-read one state file if its mtime changed; returns True if it did"""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return self.files.pop(path, None) is not None
+        known = self.files.get(path)
+        if known is not None and known[0] == mtime:
+            return False
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+        self.files[path] = (mtime, list(self._workspaces(state)))
+        return True
+
+    def _workspaces(self, state):
+        """Yield (lowercased name, path) for every folder URI in a state document"""
+        if isinstance(state, dict):
+            for key, value in state.items():
+                if key in ('folder', 'folderUri') and isinstance(value, str):
+                    path = file_uri_to_path(value)
+                    if path:
+                        yield os.path.basename(path).lower(), path
+                elif key in ('workspace', 'configPath', 'configURIPath') and isinstance(value, str):
+                    # Multi-root workspace file; titles show "<name> (Workspace)"
+                    path = file_uri_to_path(value)
+                    if path:
+                        name = os.path.splitext(os.path.basename(path))[0]
+                        yield f"{name} (workspace)".lower(), os.path.dirname(path)
+                else:
+                    yield from self._workspaces(value)
+        elif isinstance(state, list):
+            for item in state:
+                yield from self._workspaces(item)
+
+
+class GitCloneIndex:
+    """owner/repo -> path of the local Git clones under the search roots
+
+    Built by a background thread that walks the roots (a few levels deep)
+    and reads the GitHub remotes from each clone's .git/config, so a
+    lookup is a dict access. A directory is only listed again when its
+    mtime changed and a config only re-read when its own mtime changed.
+    The listings and remotes are saved as JSON so a restarted daemon
+    answers from the previous scan straight away.
+    """
+
+    def __init__(self, roots, path=None, depth=2, interval=60.0, isdir=os.path.isdir):
+        self.roots = roots  # () -> directories to scan, in priority order
+        self.path = path
+        self.isdir = isdir
+        self.depth = depth  # levels below a root that are searched for clones
+        self.interval = interval  # seconds between background rescans
+        self.dirs = {}  # directory -> (mtime, [subdirectory names])
+        self.repos = {}  # clone directory -> (config mtime, ['owner/repo', ...])
+        self.by_remote = {}  # 'owner/repo' (lowercased) -> clone directory
+        self.by_name = {}  # repo or folder name (lowercased) -> clone directory
+        self.scans = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self.load()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="clone-index", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def request_scan(self):
+        """Rescan soon, e.g. after a lookup missed a clone made since the last scan"""
+        self._wake.set()
+
+    def lookup(self, remote, name=None):
+        """Return the clone of owner/repo, else of a repo called name, or None"""
+        path = self.by_remote.get(remote.lower()) if remote else None
+        if path is None and name:
+            path = self.by_name.get(name.lower())
+        found = path is not None and self.isdir(path)
+        with self.lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return path if found else None
+
+    def stats(self):
+        with self.lock:
+            return {'clones': len(self.repos), 'scans': self.scans, 'hits': self.hits, 'misses': self.misses}
+
+    def scan(self):
+        """Walk the roots, reusing unchanged listings; returns True if the index changed"""
+        dirs, repos = {}, {}
+        for root in self.roots():
+            self._walk(root, self.depth, dirs, repos)
+        changed = repos != self.repos
+        listings_changed = dirs != self.dirs
+        by_remote, by_name = self._tables(repos)
+        with self.lock:
+            self.dirs, self.repos = dirs, repos
+            self.by_remote, self.by_name = by_remote, by_name
+            self.scans += 1
+        if changed or listings_changed:
+            self.save()
+        return changed
+
+    def load(self):
+        """Load the listings saved by a previous run; a missing or bad file means a cold index"""
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            self.dirs = {path: (mtime, names) for path, (mtime, names) in saved['dirs'].items()}
+            self.repos = {path: (mtime, remotes) for path, (mtime, remotes) in saved['repos'].items()}
+        except (OSError, ValueError, TypeError, KeyError):
+            self.dirs, self.repos = {}, {}
+        self.by_remote, self.by_name = self._tables(self.repos)
+
+    def save(self):
+        """Write the listings atomically so a crash never leaves a half-written file"""
+        if not self.path:
+            return
+        with self.lock:
+            saved = {'dirs': self.dirs, 'repos': self.repos}
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(saved, f)
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"Could not save clone index: {e}")
+
+    def _tables(self, repos):
+        """Build the lookup dicts; earlier roots win when clones share a remote or name"""
+        by_remote, by_name = {}, {}
+        for path, (mtime, remotes) in repos.items():
+            for remote in remotes:
+                by_remote.setdefault(remote, path)
+                by_name.setdefault(remote.split('/')[1], path)
+            by_name.setdefault(os.path.basename(path).lower(), path)
+        return by_remote, by_name
+
+    def _walk(self, directory, depth, dirs, repos):
+        config = os.path.join(directory, '.git', 'config')
+        try:
+            config_mtime = os.stat(config).st_mtime_ns
+        except OSError:
+            config_mtime = None
+        if config_mtime is not None:
+            known = self.repos.get(directory)
+            if known is not None and known[0] == config_mtime:
+                repos[directory] = known
+            else:
+                repos[directory] = (config_mtime, self._remotes(config))
+            return
+        if depth <= 0:
+            return
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            return
+        known = self.dirs.get(directory)
+        if known is not None and known[0] == mtime:
+            names = known[1]
+        else:
+            try:
+                names = sorted(entry.name for entry in os.scandir(directory)
+                               if entry.is_dir() and not entry.name.startswith('.'))
+            except OSError:
+                return
+        dirs[directory] = (mtime, names)
+        for name in names:
+            self._walk(os.path.join(directory, name), depth - 1, dirs, repos)
+
+    def _remotes(self, config):
+        """'owner/repo' of every GitHub remote URL in a .git/config"""
+        remotes = []
+        try:
+            with open(config, 'r', encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    key, sep, value = line.partition('=')
+                    if sep and key.strip() == 'url':
+                        match = GITHUB_REMOTE_RE.search(value.strip())
+                        if match:
+                            remote = f"{match.group(1)}/{match.group(2)}".lower()
+                            if remote not in remotes:
+                                remotes.append(remote)
+        except OSError:
+            pass
+        return remotes
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Clone scan failed: {e}")
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+class ScreenshotEncoder:
+    """Background worker that encodes and saves grabbed screenshots
+
+    reserve() hands out a unique file name immediately so the caller can
+    reference the file before it exists. Files are written to a temporary
+    name and renamed into place, so a reader never sees a partial image.
+    """
+
+    EXTENSIONS = {'PNG': '.png', 'JPEG': '.jpg', 'WEBP': '.webp'}
+
+    def __init__(self, image_format='PNG', compress_level=6, quality=85, max_dimension=None,
+                 prefix='browser_screenshot', tracer=None):
+        if image_format not in self.EXTENSIONS:
+            raise ValueError(f"Unsupported screenshot format: {image_format}")
+        self.image_format = image_format
+        self.compress_level = compress_level  # PNG zlib level, 0-9
+        self.quality = quality  # JPEG/WEBP quality
+        self.max_dimension = max_dimension  # downscale longest side to this, None keeps size
+        self.prefix = prefix
+        self.tracer = tracer
+        self.reserved = set()
+        self.written = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+        self.queue = queue.Queue()
+        self._thread = None
+
+    def reserve(self, save_dir):
+        """Return a new screenshot path in save_dir that no other capture will use"""
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        extension = self.EXTENSIONS[self.image_format]
+        with self.lock:
+            counter = 0
+            while True:
+                suffix = f"_{counter}" if counter else ""
+                filepath = os.path.join(save_dir, f"{self.prefix}_{timestamp}{suffix}{extension}")
+                if filepath not in self.reserved and not os.path.exists(filepath):
+                    break
+                counter += 1
+            self.reserved.add(filepath)
+        return filepath
+
+    def submit(self, image, filepath):
+        """Queue an image for encoding to a reserved path"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="screenshot-encoder", daemon=True)
+            self._thread.start()
+        gesture = self.tracer.gesture if self.tracer is not None else None
+        self.queue.put((image, filepath, gesture))
+
+    def flush(self):
+        """Block until every queued screenshot has been written"""
+        self.queue.join()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.queue.put(None)
+        self._thread.join(timeout=10.0)
+        self._thread = None
+
+    def encode(self, image, filepath):
+        """Encode one image to filepath with the configured settings"""
+        if self.max_dimension and max(image.size) > self.max_dimension:
+            image = image.copy()
+            image.thumbnail((self.max_dimension, self.max_dimension))
+        if self.image_format == 'PNG':
+            options = {'compress_level': self.compress_level}
+        else:
+            options = {'quality': self.quality}
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+        tmp_path = filepath + ".tmp"
+        image.save(tmp_path, self.image_format, **options)
+        os.replace(tmp_path, filepath)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+            image, filepath, gesture = item
+            try:
+                started = time.perf_counter()
+                self.encode(image, filepath)
+                if self.tracer is not None:
+                    self.tracer.record('screenshot.encode', time.perf_counter() - started, gesture)
+                self.written += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"Screenshot encode error: {e}")
+            finally:
+                with self.lock:
+                    self.reserved.discard(filepath)
+                self.queue.task_done()
+
+
+class ScreenshotStore(ScreenshotEncoder):
+    """Content-addressed screenshot store with per-capture names and retention quotas
+
+    Captures are kept once per distinct content in a store directory next
+    to the save directory's files, named by a hash of the raw pixels, so a
+    capture identical to an earlier one is neither encoded nor written
+    again. reserve() hands out a unique name per capture, as the plain
+    encoder does, and the worker points it at the stored object with a hard
+    link, or a copy where links are not supported; an @ reference handed
+    out earlier keeps naming the same image. After each capture the worker
+    evicts objects, together with the capture names linked to them, that
+    are older than max_age and then the oldest until they fit max_bytes.
+    """
+
+    def __init__(self, store_name='gemini_screenshots', max_bytes=200 * 1024 * 1024,
+                 max_age=7 * 24 * 3600, **options):
+        super().__init__(**options)
+        self.store_name = store_name
+        self.max_bytes = max_bytes
+        self.max_age = max_age  # seconds
+        self.deduped = 0
+        self.evicted = 0
+
+    def digest(self, image):
+        """Hash of the pixels (and their layout), independent of the encoding"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode('ascii'))
+        h.update(image.tobytes())
+        return h.hexdigest()
+
+    def encode(self, image, filepath):
+        """Store image by content unless already present, then link the capture's name to it"""
+        save_dir = os.path.dirname(filepath)
+        store = os.path.join(save_dir, self.store_name)
+        os.makedirs(store, exist_ok=True)
+        stored = os.path.join(store, self.digest(image) + self.EXTENSIONS[self.image_format])
+        if os.path.exists(stored):
+            self.deduped += 1
+            os.utime(stored)  # counts as recently used for the age quota
+        else:
+            super().encode(image, stored)
+        
+        tmp_path = filepath + ".tmp"
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            os.link(stored, tmp_path)
+        except OSError:
+            shutil.copyfile(stored, tmp_path)
+        os.replace(tmp_path, filepath)
+        self.evict(save_dir, keep=filepath)
+
+    def evict(self, save_dir, keep=None):
+        """Drop objects past max_age, then the oldest until the store fits max_bytes
+
+        Names sharing a file (an object and its hard-linked captures) are
+        counted and removed together.
+        """
+        now = time.time()
+        store = os.path.join(save_dir, self.store_name)
+        extension = self.EXTENSIONS[self.image_format]
+        files = {}  # (device, inode) or path -> [mtime, size, paths]
+        for directory, prefix in ((store, ''), (save_dir, self.prefix + '_')):
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if (entry.name.startswith(prefix) and not entry.name.endswith('.tmp')
+                            and (prefix == '' or entry.name.endswith(extension)) and entry.is_file()):
+                        # os.stat rather than entry.stat(): the latter has no inode on Windows
+                        info = os.stat(entry.path)
+                        identity = (info.st_dev, info.st_ino) if info.st_ino else entry.path
+                        files.setdefault(identity, [info.st_mtime, info.st_size, []])[2].append(entry.path)
+        objects = sorted(files.values())
+        total = sum(size for _, size, _ in objects)
+        for mtime, size, paths in objects:
+            if keep in paths or (now - mtime <= self.max_age and total <= self.max_bytes):
+                continue
+            try:
+                for path in paths:
+                    os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evicted += 1
+
+    def stats(self):
+        return {'captures': self.written, 'deduped': self.deduped, 'evicted': self.evicted, 'failed': self.failed}
+
+
+def encode_observation(kind, result):
+    """JSON form of something a resolver learned from the OS, see GestureRecorder"""
+    if kind == 'stat':
+        return 'dir' if stat.S_ISDIR(result.st_mode) else 'file'
+    return result
+
+
+class GestureRecorder:
+    """Opt-in JSON-lines log of each gesture's inputs, result and stage timings
+
+    Calls through which resolvers learn about the OS (stat, clipboard,
+    Explorer folders, editor and clone indexes, the process tree) are
+    wrapped with observed(); their arguments and answers pile up until the
+    next gesture is written, so speculative and prefetch passes for that
+    gesture are included. A gesture answered from the result cache gets the
+    observations of the gesture that filled the cache entry. benchmark.py
+    can replay such a log offline.
+    """
+
+    def __init__(self, path, max_observations=4096, remember=128):
+        self.path = path
+        self.max_observations = max_observations
+        self.remember = remember
+        self.observations = {}  # kind -> {JSON-encoded args: encoded result}
+        self.by_window = OrderedDict()  # window key -> observations of its last resolution
+        self.count = 0
+        self.recorded = 0
+        self.config = None  # resolver config overrides written last
+        self.lock = threading.Lock()
+
+    def observed(self, kind, func):
+        """Wrap func so each call's arguments and result are noted under kind"""
+        def call(*args):
+            key = json.dumps(args, default=sorted)
+            try:
+                result = func(*args)
+            except Exception:
+                self.note(kind, key, None)
+                raise
+            self.note(kind, key, None if result is None else encode_observation(kind, result))
+            return result
+        return call
+
+    def note(self, kind, key, value):
+        with self.lock:
+            if self.count < self.max_observations:
+                self.observations.setdefault(kind, {})[key] = value
+                self.count += 1
+
+    def write(self, record, config, window_key=None, cached=False):
+        """Append one gesture with everything observed since the previous one"""
+        with self.lock:
+            observations = self.observations
+            self.observations = {}
+            self.count = 0
+            if window_key is not None:
+                earlier = self.by_window.get(window_key)
+                if not cached:
+                    self.by_window[window_key] = observations
+                elif earlier is not None:
+                    # Nothing was resolved this time; replay needs what the cached answer came from
+                    observations = {kind: dict(earlier.get(kind, {}), **observations.get(kind, {}))
+                                    for kind in set(earlier) | set(observations)}
+                if window_key in self.by_window:
+                    self.by_window.move_to_end(window_key)
+                    while len(self.by_window) > self.remember:
+                        self.by_window.popitem(last=False)
+            record['observed'] = observations
+            if config is not self.config:
+                record['config'] = config
+                self.config = config
+            self.recorded += 1
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, separators=(',', ':'), default=str) + "\n")
+        except OSError as e:
+            print(f"Could not record gesture: {e}")
+
+
+class GeminiLauncher:
+    """Starts Gemini CLI in a new console window without going through a shell
+
+    The command ('gemini', or 'npx @google/gemini-cli' when gemini is not
+    installed) is looked up on PATH once and cached; the lookup is redone
+    when PATH or PATHEXT change, when the cached executable has since been
+    removed, and while it found nothing or only the npx fallback, so that
+    installing gemini later is picked up.
+    """
+
+    COMMANDS = (['gemini'], ['npx', '@google/gemini-cli'])
+
+    def __init__(self, environ=None, popen=subprocess.Popen, isfile=os.path.isfile):
+        self.environ = os.environ if environ is None else environ
+        self.popen = popen
+        self.isfile = isfile
+        self.command = None
+        self.fallback = False  # command is npx rather than an installed gemini
+        self.cache_key = None
+        self.lookups = 0
+
+    def resolve_command(self):
+        """Return the argv used to run Gemini, or None if neither command is on PATH"""
+        key = (self.environ.get('PATH', ''), self.environ.get('PATHEXT', ''))
+        if (key != self.cache_key or self.command is None or self.fallback
+                or not self.isfile(self.command[0])):
+            self.command = self._find_command(key[0])
+            self.cache_key = key
+            self.lookups += 1
+        return self.command
+
+    def terminal_argv(self, command):
+        """Wrap command so it runs in a console that stays open after Gemini exits"""
+        if os.name == 'nt':
+            return [self.environ.get('COMSPEC', 'cmd.exe'), '/k'] + command
+        return list(command)
+
+    def launch(self, path, hidden=False):
+        """Start Gemini with path as its working directory; returns the process
+
+        hidden=True starts the console window hidden, for parked warm sessions.
+        """
+        command = self.resolve_command()
+        if command is None:
+            raise FileNotFoundError("neither 'gemini' nor 'npx' was found on PATH")
+        argv = self.terminal_argv(command)
+        options = {'cwd': path, 'creationflags': getattr(subprocess, 'CREATE_NEW_CONSOLE', 0)}
+        if hidden and os.name == 'nt':
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+            startupinfo.wShowWindow = 0  # SW_HIDE
+            options['startupinfo'] = startupinfo
+        return self.popen(argv, **options)
+
+    def _find_command(self, search_path):
+        for command in self.COMMANDS:
+            executable = shutil.which(command[0], path=search_path)
+            if executable:
+                self.fallback = command is not self.COMMANDS[0]
+                return [executable] + command[1:]
+        self.fallback = False
+        return None
+
+
+class ConsoleSessionBackend:
+    """Starts parked Gemini sessions in hidden consoles and reveals them on demand
+
+    Off Windows the sessions are plain child processes and reveal() is a
+    no-op, which is enough to exercise WarmSessionPool with a stand-in CLI.
+    """
+
+    SW_SHOW = 5
+
+    def __init__(self, launcher):
+        self.launcher = launcher
+
+    def start(self, directory):
+        return self.launcher.launch(directory, hidden=True)
+
+    def alive(self, session):
+        return session.poll() is None
+
+    def reveal(self, session):
+        """Show the session's console window and bring it to the front"""
+        if win32gui is None:
+            return True
+        found = []
+
+        def match(hwnd, _):
+            _, pid = win32process.GetWindowThreadProcessId(hwnd)
+            if pid == session.pid:
+                found.append(hwnd)
+            return True
+
+        win32gui.EnumWindows(match, None)
+        for hwnd in found:
+            win32gui.ShowWindow(hwnd, self.SW_SHOW)
+            try:
+                win32gui.SetForegroundWindow(hwnd)
+            except Exception:
+                pass
+        return bool(found)
+
+    def terminate(self, session):
+        import psutil
+        try:
+            for child in psutil.Process(session.pid).children(recursive=True):
+                child.kill()
+        except psutil.Error:
+            pass
+        session.kill()
+        try:
+            session.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def memory(self, session):
+        """Resident memory of the session and everything it started, in bytes"""
+        import psutil
+        try:
+            process = psutil.Process(session.pid)
+            processes = [process] + process.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+
+class WarmSessionPool:
+    """Pre-started Gemini sessions parked in the most recently used directories
+
+    acquire() hands a parked session to a gesture whose directory matches;
+    everything else falls back to a cold start. Sessions are evicted when
+    idle for longer than idle_timeout, when they exit on their own, and
+    (least recently used first) while the pool's total memory is over
+    memory_cap. Sessions are started and evicted on the pool's own thread;
+    note_directory() only wakes it.
+    """
+
+    def __init__(self, backend, size=2, idle_timeout=1800.0, memory_cap=768 * 1024 * 1024,
+                 history=16):
+        self.backend = backend
+        self.size = size
+        self.idle_timeout = idle_timeout  # seconds
+        self.memory_cap = memory_cap  # bytes
+        self.history = history
+        self.recent = OrderedDict()  # normalized directory -> directory, most recent last
+        self.sessions = OrderedDict()  # normalized directory -> (session, parked_at)
+        self.hits = 0
+        self.misses = 0
+        self.started = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()  # set when recent directories may need a session
+        self._thread = None
+
+    def start(self, interval=30.0):
+        """Run maintain() periodically, and replenish() when woken, on a background thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,),
+                                            name="warm-pool", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop maintenance and terminate every parked session"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+        with self.lock:
+            sessions = [session for session, _ in self.sessions.values()]
+            self.sessions.clear()
+        for session in sessions:
+            self.backend.terminate(session)
+
+    def note_directory(self, directory):
+        """Record a directory a gesture resolved to and have the pool thread replenish"""
+        key = os.path.normcase(os.path.abspath(directory))
+        with self.lock:
+            self.recent[key] = directory
+            self.recent.move_to_end(key)
+            while len(self.recent) > self.history:
+                self.recent.popitem(last=False)
+        self._wake.set()
+
+    def acquire(self, directory):
+        """Reveal a parked session for directory; returns False if there is none"""
+        key = os.path.normcase(os.path.abspath(directory))
+        with self.lock:
+            entry = self.sessions.pop(key, None)
+        if entry is not None and self.backend.alive(entry[0]) and self.backend.reveal(entry[0]):
+            self.hits += 1
+            return True
+        if entry is not None:
+            self.backend.terminate(entry[0])
+        self.misses += 1
+        return False
+
+    def replenish(self):
+        """Park sessions for the most recent directories that do not have one"""
+        self.maintain()
+        with self.lock:
+            wanted = [(key, directory) for key, directory in reversed(self.recent.items())
+                      if key not in self.sessions][:max(0, self.size - len(self.sessions))]
+        for key, directory in wanted:
+            if not os.path.isdir(directory):
+                continue
+            try:
+                session = self.backend.start(directory)
+            except Exception as e:
+                print(f"Could not start warm session: {e}")
+                return
+            with self.lock:
+                self.sessions[key] = (session, time.monotonic())
+                self.started += 1
+        self.maintain()
+
+    def maintain(self):
+        """Evict dead, idle and over-budget sessions"""
+        now = time.monotonic()
+        evict = []
+        with self.lock:
+            for key, (session, parked_at) in list(self.sessions.items()):
+                if now - parked_at > self.idle_timeout or not self.backend.alive(session):
+                    evict.append(self.sessions.pop(key)[0])
+            # Oldest parked sessions go first while the pool is over its memory cap
+            usage = {key: self.backend.memory(session) for key, (session, _) in self.sessions.items()}
+            total = sum(usage.values())
+            for key in list(self.sessions):
+                if total <= self.memory_cap:
+                    break
+                total -= usage[key]
+                evict.append(self.sessions.pop(key)[0])
+            self.evicted += len(evict)
+        for session in evict:
+            self.backend.terminate(session)
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'started': self.started,
+                'evicted': self.evicted,
+                'parked': len(self.sessions),
+            }
+
+    def _run(self, interval):
+        while True:
+            woken = self._wake.wait(interval)
+            if self._stop.is_set():
+                break
+            self._wake.clear()
+            try:
+                if woken:
+                    self.replenish()
+                else:
+                    self.maintain()
+            except Exception as e:
+                print(f"Warm pool maintenance failed: {e}")
+
+
+class ForegroundWindowSource:
+    """Polls the foreground window; a fake with the same current() works off Windows"""
+
+    def __init__(self, desktop):
+        self.desktop = desktop
+
+    def current(self):
+        """Return (hwnd, title) of the foreground window, or None"""
+        hwnd = self.desktop.foreground_window()
+        if not hwnd:
+            return None
+        return hwnd, self.desktop.window_text(hwnd)
+
+
+class ForegroundPrefetcher:
+    """Background thread that pre-resolves windows as they gain focus
+
+    A window is only resolved once it has stayed in the foreground (with the
+    same title) for the debounce period, so alt-tabbing through windows does
+    not hit psutil/COM for each one. After each prefetch the thread sleeps
+    long enough to keep its own CPU time under cpu_budget (a fraction of one
+    core). note_gesture() counts how often a gesture lands on a window that
+    was already warmed.
+    """
+
+    def __init__(self, source, prefetch, poll_interval=0.25, debounce=0.5,
+                 cpu_budget=0.02, remember=16):
+        self.source = source
+        self.prefetch = prefetch  # prefetch(hwnd) -> window key or None
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.cpu_budget = cpu_budget
+        self.remember = remember
+        self.warmed = OrderedDict()  # window key -> time prefetched
+        self.prefetches = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def note_gesture(self, key):
+        """Record whether a gesture's window had been prefetched"""
+        with self.lock:
+            if key in self.warmed:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self.lock:
+            gestures = self.hits + self.misses
+            return {
+                'prefetches': self.prefetches,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / gestures if gestures else 0.0,
+            }
+
+    def _run(self):
+        seen = None  # (hwnd, title) currently in the foreground
+        seen_since = 0.0
+        done = None  # last (hwnd, title) that was prefetched
+        while not self._stop.wait(self.poll_interval):
+            try:
+                current = self.source.current()
+            except Exception:
+                current = None
+            now = time.monotonic()
+            if current != seen:
+                seen, seen_since = current, now
+                continue
+            if current is None or current == done or now - seen_since < self.debounce:
+                continue
+            done = current
+            started = time.thread_time()
+            try:
+                key = self.prefetch(current[0])
+            except Exception as e:
+                print(f"Prefetch failed: {e}")
+                key = None
+            cost = time.thread_time() - started
+            with self.lock:
+                self.prefetches += 1
+                if key is not None:
+                    self.warmed[key] = now
+                    self.warmed.move_to_end(key)
+                    while len(self.warmed) > self.remember:
+                        self.warmed.popitem(last=False)
+            # Stay within the CPU budget before looking at the next window
+            if self.cpu_budget > 0 and cost > 0:
+                self._stop.wait(cost / self.cpu_budget - cost)
+
+
+class ShellApplicationBackend:
+    """Shell.Application access for ExplorerShellWorker
+
+    Every method is called on the worker's own thread. A fake with the same
+    methods can stand in for it where COM is not available.
+    """
 
-class GeminiDoubleMiddleClick:
     def __init__(self):
+        self.shell = None
+
+    def initialize(self):
+        """Enter the STA and create the Shell.Application dispatch object"""
+        import pythoncom
+        import win32com.client
+        pythoncom.CoInitialize()
+        self.shell = win32com.client.Dispatch("Shell.Application")
+
+    def uninitialize(self):
+        import pythoncom
+        self.shell = None
+        pythoncom.CoUninitialize()
+
+    def window_count(self):
+        """Cheap change check: number of open shell windows"""
+        return self.shell.Windows().Count
+
+    def windows(self):
+        """Yield (hwnd, window) for every open shell window"""
+        for window in self.shell.Windows():
+            try:
+                yield window.HWND, window
+            except Exception:
+                continue
+
+    def folder(self, window):
+        """Return the folder a shell window is currently showing"""
+        return window.Document.Folder.Self.Path
+
+
+class ExplorerShellWorker:
+    """Long-lived STA thread that answers HWND -> folder lookups for Explorer windows
+
+    The dispatch object and the shell window objects are kept alive between
+    clicks. Known windows are re-read individually (Explorer windows can
+    navigate), and the full shell.Windows() walk only happens when an HWND
+    is not known yet or the window count changed.
+    """
+
+    def __init__(self, backend, timeout=2.0):
+        self.backend = backend
+        self.timeout = timeout
+        self.windows = {}  # hwnd -> backend window object (worker thread only)
+        self.folders = {}  # hwnd -> last known folder
+        self.window_count = None
+        self.hits = 0
+        self.refreshes = 0
+        self.requests = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="explorer-shell", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self.requests.put(None)
+        self._thread.join(timeout=self.timeout)
+        self._thread = None
+
+    def lookup(self, hwnd):
+        """Return the folder shown by an Explorer window, or None"""
+        done = threading.Event()
+        result = [None]
+        self.requests.put((hwnd, result, done))
+        if not done.wait(self.timeout):
+            # Worker is stuck in COM - fall back to what we knew last
+            print("COM lookup timed out, using last known folder")
+            return self.folders.get(hwnd)
+        return result[0]
+
+    def _run(self):
+        try:
+            self.backend.initialize()
+        except Exception as e:
+            print(f"COM Error details: {e}")
+            self._drain()
+            return
+        try:
+            while True:
+                request = self.requests.get()
+                if request is None:
+                    break
+                hwnd, result, done = request
+                try:
+                    result[0] = self._resolve(hwnd)
+                except Exception as e:
+                    print(f"COM Error details: {e}")
+                done.set()
+        finally:
+            self.backend.uninitialize()
+
+    def _drain(self):
+        """Release waiting callers when the backend could not be initialized"""
+        while True:
+            try:
+                request = self.requests.get_nowait()
+            except queue.Empty:
+                return
+            if request is not None:
+                request[2].set()
+
+    def _resolve(self, hwnd):
+        count = self.backend.window_count()
+        if hwnd not in self.windows or count != self.window_count:
+            self._refresh(count)
+        else:
+            self.hits += 1
+        window = self.windows.get(hwnd)
+        if window is None:
+            return None
+        try:
+            path = self.backend.folder(window)
+        except Exception:
+            # Window closed or not a folder view any more
+            self.windows.pop(hwnd, None)
+            self.folders.pop(hwnd, None)
+            return None
+        self.folders[hwnd] = path
+        return path
+
+    def _refresh(self, count):
+        """Add new shell windows and forget the ones that have closed"""
+        self.refreshes += 1
+        seen = {}
+        for hwnd, window in self.backend.windows():
+            seen[hwnd] = self.windows.get(hwnd, window)
+        for hwnd in list(self.folders):
+            if hwnd not in seen:
+                del self.folders[hwnd]
+        self.windows = seen
+        self.window_count = count
+
+
+class AlreadyRunning(Exception):
+    """Another daemon already owns the control channel"""
+
+
+def control_address():
+    """Named pipe on Windows, a per-user Unix socket elsewhere"""
+    if os.name == 'nt':
+        return r'\\.\pipe\gemini-hotkey-' + os.environ.get('USERNAME', 'user')
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), f"gemini-hotkey-{os.getuid()}.sock")
+
+
+def send_control(command, address=None, timeout=2.0, **args):
+    """Send a command to the running daemon; returns its reply, or None if none is running
+
+    Keyword arguments are passed on to the command's handler.
+    """
+    from multiprocessing.connection import Client
+    try:
+        conn = Client(address or control_address())
+    except (OSError, EOFError):
+        return None
+    with conn:
+        conn.send_bytes(json.dumps({'command': command, 'args': args}).encode('utf-8'))
+        if not conn.poll(timeout):
+            raise TimeoutError(f"daemon did not answer '{command}'")
+        return json.loads(conn.recv_bytes().decode('utf-8'))
+
+
+class ControlServer:
+    """Local control channel that also acts as the single-instance lock
+
+    Binding the address fails while another daemon holds it, so start()
+    raises AlreadyRunning instead of letting a second instance hook the
+    mouse. Requests and replies are small JSON documents; handlers map a
+    command name to a function that takes the request's args as keyword
+    arguments and returns a JSON-serializable dict.
+    """
+
+    def __init__(self, handlers, address=None):
+        self.handlers = handlers
+        self.address = address or control_address()
+        self.listener = None
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        from multiprocessing.connection import Listener
+        if os.name != 'nt' and os.path.exists(self.address):
+            try:
+                running = send_control('status', self.address) is not None
+            except TimeoutError:
+                # Accepted but never answered: a hung daemon still holds the socket
+                running = True
+            if running:
+                raise AlreadyRunning(self.address)
+            # Left behind by a daemon that did not shut down cleanly
+            os.unlink(self.address)
+        try:
+            self.listener = Listener(self.address)
+        except OSError as e:
+            raise AlreadyRunning(self.address) from e
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="control", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self.listener is None:
+            return
+        self._stopping = True
+        # Wake the blocking accept() so the thread can see the flag
+        try:
+            from multiprocessing.connection import Client
+            Client(self.address).close()
+        except OSError:
+            pass
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+        self.listener.close()
+        self.listener = None
+
+    def _run(self):
+        while not self._stopping:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break
+            with conn:
+                if self._stopping:
+                    break
+                try:
+                    self._serve(conn)
+                except Exception as e:
+                    # Bad request or dropped connection; keep serving the next one
+                    print(f"Control request failed: {e}")
+
+    def _serve(self, conn):
+        if not conn.poll(1.0):
+            return
+        request = json.loads(conn.recv_bytes().decode('utf-8'))
+        handler = self.handlers.get(request.get('command'))
+        if handler is None:
+            reply = {'ok': False, 'error': f"unknown command, expected one of: {', '.join(sorted(self.handlers))}"}
+        else:
+            try:
+                reply = dict(handler(**request.get('args', {})), ok=True)
+            except Exception as e:
+                # A failing handler must not take the control thread down with it
+                print(f"Control command '{request.get('command')}' failed: {e}")
+                reply = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+        conn.send_bytes(json.dumps(reply, default=str).encode('utf-8'))
+
+
+class GeminiDoubleMiddleClick:
+    def __init__(self, parallel_resolution=False, resolution_deadline=0.15, prefetch=False,
+                 warm_sessions=0, modifiers=None, trace=False, desktop=None, process_factory=None,
+                 shell_backend=None, launcher=None, state_dir=None, appdata_dir=None, prober=None,
+                 process_table=None, record=None, screenshot_options=None):
+        # OS backends; the defaults talk to Windows, fakes can be passed instead
+        self.desktop = desktop if desktop is not None else WindowsDesktop()
+        # Where caches that outlive the daemon are kept
+        self.state_dir = state_dir or os.path.dirname(os.path.abspath(__file__))
+        # Every path check on the click path goes through here, under a timeout
+        self.prober = prober if prober is not None else PathProber()
         self.running = True
+        self.started_at = time.time()
+        self.reload_requested = False  # set by the 'reload' control command
         self.last_middle_click_time = 0
         self.last_click_pos = (0, 0)
         self.double_click_threshold = 0.5  # 500ms
-        self.shift_pressed = False  # Track if Shift key is held
+        # Shift state is read when a middle-click arrives
+        self.modifiers = modifiers if modifiers is not None else KeyStateModifiers()
         self.last_screenshot = None  # Track last screenshot path
+        # Window resolved on the first click, consumed by the second
+        self.speculation = None
+        self.speculation_distance = 16  # pixels
+        self.speculation_hits = 0
+        self.speculation_misses = 0
+        # Per-stage latency spans, see trace_report(); recordings include them
+        self.tracer = Tracer(enabled=trace or bool(record))
+        # Finds the gemini/npx executable once and spawns it directly
+        self.launcher = launcher if launcher is not None else GeminiLauncher()
+        # Optional: Gemini sessions parked in recently used directories
+        self.warm_pool = None
+        if warm_sessions:
+            self.warm_pool = WarmSessionPool(ConsoleSessionBackend(self.launcher), size=warm_sessions)
+        # Encodes, dedupes and expires browser screenshots off the click path
+        # screenshot_options: ScreenshotEncoder settings such as image_format or max_dimension
+        self.screenshot_encoder = ScreenshotStore(tracer=self.tracer, **(screenshot_options or {}))
+        # Resolution and launch run on this worker, never on the hook thread
+        self.pipeline = GesturePipeline(self.handle_gesture)
+        # name/cmdline/cwd of window owners, shared across gestures
+        self.process_cache = ProcessInfoCache(process_factory=process_factory)
+        # Who runs inside which terminal, from one process-table snapshot
+        self.process_tree = ProcessTreeSnapshot(process_table)
+        # Resolved directories per window, kept across daemon restarts
+        self.result_cache = ResolutionCache(os.path.join(self.state_dir, "resolution_cache.json"),
+                                            isdir=self.prober.isdir)
+        # Long-lived COM apartment for Explorer folder lookups
+        self.explorer_shell = ExplorerShellWorker(shell_backend or ShellApplicationBackend())
+        # Process lists, search roots and title formats, reloaded on change
+        self.resolver_config = ResolverConfig(os.path.join(self.state_dir, "resolver_config.json"),
+                                              on_change=self.apply_resolver_config)
+        # Recently opened workspaces, read from the editors' own state files
+        appdata_dir = appdata_dir or os.environ.get('APPDATA') or os.path.expanduser("~\\AppData\\Roaming")
+        self.workspaces = {
+            process_name: EditorWorkspaceIndex(os.path.join(appdata_dir, state_dir_name, 'User'))
+            for process_name, state_dir_name in EDITOR_STATE_DIRS.items()
+        }
+        # Local Git clones by GitHub remote, scanned in the background
+        self.clone_index = GitCloneIndex(lambda: self.resolver_config.table.clone_roots,
+                                         os.path.join(self.state_dir, "clone_index.json"),
+                                         isdir=self.prober.isdir)
+        # Resolution strategies, dispatched on process name / window class
+        self.resolvers = ResolverRegistry(tracer=self.tracer)
+        self.register_resolvers()
+        self.resolver_config.refresh()
+        # Optional: run independent resolvers concurrently under a time budget
+        self.resolution_deadline = resolution_deadline  # seconds
+        self.resolver_pool = None
+        if parallel_resolution:
+            import concurrent.futures
+            self.resolver_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=4, thread_name_prefix="resolver"
+            )
+        # Optional: log every gesture's inputs for benchmark.py to replay
+        self.recorder = None
+        self.last_context = None  # WindowContext of the last gesture
+        self.last_source = None  # what answered it: resolver name, 'speculation', 'cache' or 'default'
+        self.last_resolved = False  # whether resolvers ran for it, here or on the first click
+        if record:
+            self.recorder = GestureRecorder(record)
+            for kind, owner, attribute in self.observation_points():
+                setattr(owner, attribute, self.recorder.observed(kind, getattr(owner, attribute)))
+        # Optional: keep the focused windows' directories warm in the result cache
+        self.prefetcher = None
+        if prefetch:
+            self.prefetcher = ForegroundPrefetcher(ForegroundWindowSource(self.desktop), self.prefetch_window)
         
+    def observation_points(self):
+        """(kind, object, method name) of every call through which resolvers learn about the OS"""
+        points = [
+            ('stat', self.prober, 'fs_stat'),
+            ('clipboard', self.desktop, 'clipboard_paste'),
+            ('explorer', self.explorer_shell, 'lookup'),
+            ('clones', self.clone_index, 'lookup'),
+            ('shell_cwd', self.process_cache, 'current_cwd'),
+            ('process_tree', self.process_tree, 'newest_descendant'),
+            ('process_parent', self.process_tree, 'parent'),
+        ]
+        points += [(f"workspace:{name}", index, 'lookup') for name, index in self.workspaces.items()]
+        return points
+    
     def capture_window_to_file(self, hwnd, save_dir):
         """Capture a window screenshot to a file"""
         print(f"Attempting to capture screenshot...")
         try:
             # Get window rectangle
-            rect = win32gui.GetWindowRect(hwnd)
+            rect = self.desktop.window_rect(hwnd)
             x, y, right, bottom = rect
             print(f"Window rect: {x}, {y}, {right}, {bottom}")
             
             # Capture the window
-            screenshot = ImageGrab.grab(bbox=(x, y, right, bottom))
+            with self.tracer.span('screenshot.grab'):
+                screenshot = self.desktop.grab((x, y, right, bottom))
             
-            # Save to file with timestamp
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            filename = f"browser_screenshot_{timestamp}.png"
-            filepath = os.path.join(save_dir, filename)
+            # Reserve the file name now, encode and write it in the background
+            filepath = self.screenshot_encoder.reserve(save_dir)
+            self.screenshot_encoder.submit(screenshot, filepath)
             
-            screenshot.save(filepath, "PNG")
-            
-            print(f"✓ Screenshot saved: {filename}")
+            print(f"✓ Screenshot queued: {os.path.basename(filepath)}")
             print(f"  Full path: {filepath}")
             return filepath
         except Exception as e:
@@ -54,318 +2393,153 @@ class GeminiDoubleMiddleClick:
             import traceback
             traceback.print_exc()
             return None
-        """Get Explorer path using COM in a thread-safe way"""
-        result = [None]  # Use list to store result from thread
+    
+    def get_explorer_path_com(self, hwnd):
+        """Get Explorer path from the persistent Shell.Application worker"""
+        self.explorer_shell.start()
+        return self.explorer_shell.lookup(hwnd)
+    
+    def identify_window(self, x, y):
+        """Return the WindowContext of the top-level window at coordinates, or None"""
+        # Get window at point
+        hwnd = self.desktop.window_from_point(x, y)
+        if not hwnd:
+            return None
         
-        def get_path():
-            try:
-                pythoncom.CoInitialize()
-                shell = win32com.client.Dispatch("Shell.Application")
-                for window in shell.Windows():
-                    try:
-                        if window.HWND == hwnd:
-                            result[0] = window.Document.Folder.Self.Path
-                            break
-                    except:
-                        continue
-                pythoncom.CoUninitialize()
-            except Exception as e:
-                print(f"COM Error details: {e}")
-                pythoncom.CoUninitialize()
+        # Get top-level window
+        while hwnd:
+            parent = self.desktop.parent(hwnd)
+            if not parent or parent == hwnd:
+                break
+            hwnd = parent
         
-        # Run in thread to ensure proper COM initialization
-        thread = threading.Thread(target=get_path)
-        thread.start()
-        thread.join(timeout=2.0)  # Wait max 2 seconds
+        return self.describe_window(hwnd)
+    
+    def describe_window(self, hwnd):
+        """Return the WindowContext of a top-level window"""
+        # Get process info
+        pid = self.desktop.window_process_id(hwnd)
+        process = self.process_cache.get(pid)
+        process_name = process.name.lower()
         
-        return result[0]
+        # Get window info
+        window_title = self.desktop.window_text(hwnd)
+        window_class = self.desktop.window_class(hwnd)
+        
+        return WindowContext(hwnd, process, process_name, window_title, window_class)
+    
+    def window_key(self, ctx):
+        """Identity of a window for the result caches"""
+        return (ctx.hwnd, ctx.process.pid, ctx.process.create_time)
+    
+    def run_resolvers(self, ctx, speculative=False):
+        """Dispatch ctx to the resolver chain; returns (resolver name, path)"""
+        # Picks up an edited resolver_config.json before routing
+        self.resolver_config.current()
+        if self.resolver_pool is not None:
+            return self.resolvers.resolve_parallel(
+                ctx, self.resolver_pool, self.resolution_deadline, speculative=speculative
+            )
+        return self.resolvers.resolve(ctx, speculative=speculative)
+    
+    def prefetch_window(self, hwnd):
+        """Warm the result cache for a window that just gained focus; returns its key"""
+        ctx = self.describe_window(hwnd)
+        key = self.window_key(ctx)
+        if self.result_cache.get(key, ctx.title, ctx.window_class):
+            return key
+        name, path = self.run_resolvers(ctx, speculative=True)
+        if not path or not self.resolvers.is_cacheable(name):
+            return None
+        self.result_cache.put(key, ctx.title, ctx.window_class, path)
+        return key
+    
+    def speculate(self, gesture):
+        """Resolve the window under a first click ahead of the second one"""
+        self.speculation = None
+        try:
+            ctx = self.identify_window(gesture.x, gesture.y)
+            if ctx is None:
+                return
+            key = self.window_key(ctx)
+            path = self.result_cache.get(key, ctx.title, ctx.window_class)
+            resolved = not path
+            if resolved:
+                # Stops short of resolvers with side effects such as screenshots
+                name, path = self.run_resolvers(ctx, speculative=True)
+                if path and self.resolvers.is_cacheable(name):
+                    self.result_cache.put(key, ctx.title, ctx.window_class, path)
+            if path:
+                self.speculation = Speculation(gesture.x, gesture.y, gesture.time, key,
+                                               ctx.title, ctx.window_class, path, resolved)
+        except Exception as e:
+            print(f"Speculative resolution failed: {e}")
+    
+    def take_speculation(self, x, y, clicked_at, ctx):
+        """Return the Speculation if it was made for this window and click, else None"""
+        speculation = self.speculation
+        self.speculation = None
+        if speculation is None or clicked_at is None:
+            self.speculation_misses += 1
+            return None
+        if (clicked_at - speculation.time < self.double_click_threshold
+                and abs(x - speculation.x) <= self.speculation_distance
+                and abs(y - speculation.y) <= self.speculation_distance
+                and speculation.key == self.window_key(ctx)
+                and speculation.title == ctx.title
+                and speculation.window_class == ctx.window_class
+                and self.prober.isdir(speculation.path)):
+            self.speculation_hits += 1
+            return speculation
+        self.speculation_misses += 1
+        return None
     
-    def get_path_from_window(self, x, y):
+    def get_path_from_window(self, x, y, clicked_at=None):
         """Get path from window at coordinates"""
         # Reset screenshot path
         self.last_screenshot = None
+        self.last_context = None
+        self.last_source = 'default'
+        self.last_resolved = False
         
         try:
-            # Get window at point
-            hwnd = win32gui.WindowFromPoint((x, y))
-            if not hwnd:
+            with self.tracer.span('window_lookup'):
+                ctx = self.identify_window(x, y)
+            if ctx is None:
                 return os.path.expanduser("~\\Documents")
-            
-            # Get top-level window
-            while hwnd:
-                parent = win32gui.GetParent(hwnd)
-                if not parent or parent == hwnd:
-                    break
-                hwnd = parent
-            
-            # Get process info
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            process = psutil.Process(pid)
-            process_name = process.name().lower()
-            
-            # Get window info
-            window_title = win32gui.GetWindowText(hwnd)
-            window_class = win32gui.GetClassName(hwnd)
+            self.last_context = ctx
             
             print(f"\n--- Double middle-click detected ---")
-            print(f"Window: {window_title}")
-            print(f"Process: {process_name}")
-            print(f"Class: {window_class}")
+            print(f"Window: {ctx.title}")
+            print(f"Process: {ctx.process_name}")
+            print(f"Class: {ctx.window_class}")
             
-            # Method 1: File Explorer - get actual folder being viewed
-            if process_name == 'explorer.exe' and window_class == 'CabinetWClass':
-                print("Detected File Explorer window")
-                
-                # Try COM approach
-                path = self.get_explorer_path_com(hwnd)
-                if path:
-                    print(f"Explorer path found via COM: {path}")
-                    return path
-                
-                # Fallback: Try to extract from window title
-                # File Explorer format: "FolderName - File Explorer" or just "FolderName"
-                if window_title:
-                    # Remove " - File Explorer" suffix if present
-                    folder_part = window_title.replace(" - File Explorer", "").strip()
-                    
-                    # Check if it's a full path
-                    if os.path.exists(folder_part):
-                        print(f"Found full path in title: {folder_part}")
-                        return folder_part
-                    
-                    # Try to find in common locations
-                    common_paths = [
-                        os.path.expanduser(f"~\\{folder_part}"),
-                        os.path.expanduser(f"~\\Desktop\\{folder_part}"),
-                        os.path.expanduser(f"~\\Documents\\{folder_part}"),
-                        os.path.expanduser(f"~\\Downloads\\{folder_part}"),
-                        f"C:\\{folder_part}",
-                        f"D:\\{folder_part}",
-                    ]
-                    
-                    for test_path in common_paths:
-                        if os.path.exists(test_path) and os.path.isdir(test_path):
-                            print(f"Found folder from title: {test_path}")
-                            return test_path
-                    
-                    # Special case for 'Desktop' which might just show as "Desktop"
-                    if folder_part.lower() == "desktop":
-                        desktop = os.path.expanduser("~\\Desktop")
-                        print(f"Desktop folder detected: {desktop}")
-                        return desktop
-            
-            # Method 2: For editors, check command line for opened folders
-            if any(editor in process_name for editor in ['code.exe', 'cursor.exe', 'sublime_text.exe']):
-                try:
-                    cmdline = process.cmdline()
-                    # Look for --folder-uri argument (Cursor/VS Code specific)
-                    for i, arg in enumerate(cmdline):
-                        if arg == '--folder-uri' and i + 1 < len(cmdline):
-                            folder_uri = cmdline[i + 1]
-                            if folder_uri.startswith('file:///'):
-                                import urllib.parse
-                                path = urllib.parse.unquote(folder_uri[8:])
-                                path = path.replace('/', '\\')
-                                if len(path) > 1 and path[1] == ':':
-                                    path = path[0].upper() + path[1:]
-                                if os.path.exists(path):
-                                    print(f"Found folder from --folder-uri: {path}")
-                                    return path
-                    
-                    # Look for regular folder paths in arguments
-                    for arg in cmdline[1:]:  # Skip exe path
-                        if os.path.exists(arg) and os.path.isdir(arg):
-                            print(f"Found folder in args: {arg}")
-                            return arg
-                except:
-                    pass
-                
-                # For Cursor/VS Code, parse the window title
-                # Format: "filename - foldername - Cursor/VS Code"
-                if ' - Cursor' in window_title or ' - Visual Studio Code' in window_title:
-                    parts = window_title.split(' - ')
-                    if len(parts) >= 3:
-                        # The folder name is usually the second-to-last part
-                        folder_name = parts[-2].strip()
-                        # Check if it's a full path
-                        if os.path.exists(folder_name) and os.path.isdir(folder_name):
-                            print(f"Found full path in title: {folder_name}")
-                            return folder_name
-                        # Otherwise, try to find it in common locations
-                        else:
-                            # Get the file path from the first part if possible
-                            file_part = parts[0].strip()
-                            # Common project locations to check
-                            search_paths = [
-                                os.path.dirname(os.path.abspath(__file__)),  # Script directory
-                                os.getcwd(),  # Current working directory
-                                os.path.expanduser("~\\Documents"),
-                                os.path.expanduser("~\\Desktop"),
-                                os.path.expanduser("~\\source\\repos"),
-                                "C:\\projects",
-                                "D:\\projects"
-                            ]
-                            
-                            # Also check parent directories of the script
-                            script_dir = os.path.dirname(os.path.abspath(__file__))
-                            parent = os.path.dirname(script_dir)
-                            while parent and parent != os.path.dirname(parent):
-                                search_paths.append(parent)
-                                parent = os.path.dirname(parent)
-                            
-                            for search_path in search_paths:
-                                test_path = os.path.join(search_path, folder_name)
-                                if os.path.exists(test_path) and os.path.isdir(test_path):
-                                    print(f"Found folder in {search_path}: {test_path}")
-                                    return test_path
-            
-            # Method 3: Browsers - take screenshot and use Downloads folder
-            if any(browser in process_name for browser in ['chrome.exe', 'firefox.exe', 'msedge.exe', 'brave.exe', 'opera.exe', 'vivaldi.exe']):
-                print(f"Detected browser: {process_name}")
-                
-                # Use Downloads folder as default for browsers
-                downloads = os.path.expanduser("~\\Downloads")
-                if not os.path.exists(downloads):
-                    downloads = os.path.expanduser("~\\Documents")
-                
-                # Take screenshot of browser window and save to the folder
-                screenshot_path = self.capture_window_to_file(hwnd, downloads)
-                if screenshot_path:
-                    # Store the screenshot path to reference it later
-                    self.last_screenshot = screenshot_path
-                    print(f"Screenshot saved: {screenshot_path}")
-                else:
-                    self.last_screenshot = None
-                    print("Failed to capture screenshot")
-                
-                print(f"Using Downloads folder for browser context: {downloads}")
-                return downloads
-            
-            # Method 4: Get process working directory (not exe location)
-            try:
-                cwd = process.cwd()
-                # Only use if it's not a system directory
-                if cwd and os.path.exists(cwd) and not any(sys in cwd.lower() for sys in ['system32', 'windows', 'program files', 'appdata']):
-                    print(f"Using working directory: {cwd}")
-                    return cwd
-            except:
-                pass
-            
-            # Method 4: Browsers - take screenshot and use Downloads folder
-            if any(browser in process_name for browser in ['chrome.exe', 'firefox.exe', 'msedge.exe', 'brave.exe', 'opera.exe', 'vivaldi.exe']):
-                print(f"Detected browser: {process_name}")
-                
-                # Use Downloads folder as default for browsers
-                downloads = os.path.expanduser("~\\Downloads")
-                if not os.path.exists(downloads):
-                    downloads = os.path.expanduser("~\\Documents")
-                
-                # Take screenshot of browser window and save to the folder
-                screenshot_path = self.capture_window_to_file(hwnd, downloads)
-                if screenshot_path:
-                    # Store the screenshot path to reference it later
-                    self.last_screenshot = screenshot_path
-                    print(f"Screenshot saved: {screenshot_path}")
-                else:
-                    self.last_screenshot = None
-                    print("Failed to capture screenshot")
-                
-                print(f"Using Downloads folder for browser context: {downloads}")
-                return downloads
+            if self.prefetcher is not None:
+                self.prefetcher.note_gesture(self.window_key(ctx))
             
-            # Method 3: For editors, check command line for opened folders
-            if any(editor in process_name for editor in ['code.exe', 'cursor.exe', 'sublime_text.exe']):
-                try:
-                    cmdline = process.cmdline()
-                    # Look for folder paths in arguments
-                    for arg in cmdline[1:]:  # Skip exe path
-                        if os.path.exists(arg) and os.path.isdir(arg):
-                            print(f"Found folder in args: {arg}")
-                            return arg
-                except:
-                    pass
+            # The first click may already have resolved this window
+            speculation = self.take_speculation(x, y, clicked_at, ctx)
+            if speculation:
+                print(f"Using path resolved on first click: {speculation.path}")
+                self.last_source = 'speculation'
+                self.last_resolved = speculation.resolved
+                return speculation.path
             
-            # Method 4: For browsers - try to get Downloads or Desktop folder
-            if any(browser in process_name for browser in ['chrome.exe', 'firefox.exe', 'msedge.exe', 'brave.exe', 'opera.exe']):
-                print(f"Detected browser: {process_name}")
-                
-                # For browsers, we can't get the current page's context easily
-                # But we can make smart defaults:
-                
-                # If the title contains common code-related terms, use a project folder
-                title_lower = window_title.lower()
-                if any(term in title_lower for term in ['github', 'gitlab', 'bitbucket', 'localhost:', '127.0.0.1', 'codepen', 'jsfiddle', 'stackoverflow']):
-                    # Try to extract project name from title
-                    if 'github.com' in title_lower:
-                        # GitHub URLs often have format: "repo-name · owner/repo-name"
-                        import re
-                        match = re.search(r'([^/\s]+/[^/\s]+)', window_title)
-                        if match:
-                            repo_name = match.group(1).split('/')[-1]
-                            print(f"Detected GitHub repo: {repo_name}")
-                            # Look for this repo in common locations
-                            search_paths = [
-                                os.path.dirname(os.path.abspath(__file__)),
-                                os.getcwd(),
-                                os.path.expanduser("~\\source\\repos"),
-                                os.path.expanduser("~\\Documents\\GitHub"),
-                                os.path.expanduser("~\\Documents"),
-                                os.path.expanduser("~\\Desktop"),
-                                "C:\\projects",
-                                "D:\\projects"
-                            ]
-                            for search_path in search_paths:
-                                test_path = os.path.join(search_path, repo_name)
-                                if os.path.exists(test_path) and os.path.isdir(test_path):
-                                    print(f"Found matching repo folder: {test_path}")
-                                    return test_path
-                    
-                # Also check clipboard for URLs that might give context
-                try:
-                    clipboard = pyperclip.paste()
-                    if clipboard and 'github.com' in clipboard.lower():
-                        # Extract repo name from GitHub URL
-                        import re
-                        match = re.search(r'github\.com/([^/]+)/([^/\s\?]+)', clipboard)
-                        if match:
-                            repo_name = match.group(2).replace('.git', '')
-                            print(f"Found GitHub URL in clipboard: {repo_name}")
-                            # Search for this repo
-                            for search_path in search_paths:
-                                test_path = os.path.join(search_path, repo_name)
-                                if os.path.exists(test_path) and os.path.isdir(test_path):
-                                    print(f"Found repo from clipboard: {test_path}")
-                                    return test_path
-                except:
-                    pass
-                    dev_folders = [
-                        os.path.expanduser("~\\source\\repos"),
-                        os.path.expanduser("~\\Documents\\GitHub"),
-                        os.path.expanduser("~\\projects"),
-                        "C:\\projects"
-                    ]
-                    for folder in dev_folders:
-                        if os.path.exists(folder):
-                            print(f"Using development folder: {folder}")
-                            return folder
-                
-                # For general browsing, use Downloads (likely downloading files)
-                downloads = os.path.expanduser("~\\Downloads")
-                if os.path.exists(downloads):
-                    print(f"Browser detected, using Downloads: {downloads}")
-                    return downloads
+            # Reuse the last answer for this exact window if it still holds
+            key = self.window_key(ctx)
+            cached = self.result_cache.get(key, ctx.title, ctx.window_class)
+            if cached:
+                print(f"Using cached path: {cached}")
+                self.last_source = 'cache'
+                return cached
             
-            # Method 5: Extract from window title (last resort)
-            if window_title:
-                import re
-                match = re.search(r'([A-Z]:\\[^<>:"|*?\[\]]+?)(?:\s|$|"|\'|-)', window_title)
-                if match:
-                    path = match.group(1).strip()
-                    if os.path.exists(path):
-                        if os.path.isfile(path):
-                            path = os.path.dirname(path)
-                        print(f"Found in title: {path}")
-                        return path
+            name, path = self.run_resolvers(ctx)
+            self.last_resolved = True
+            if path:
+                self.last_source = name
+                if self.resolvers.is_cacheable(name):
+                    self.result_cache.put(key, ctx.title, ctx.window_class, path)
+                return path
             
         except Exception as e:
             print(f"Error getting path: {e}")
@@ -375,6 +2549,230 @@ class GeminiDoubleMiddleClick:
         print(f"Using default: {default}")
         return default
     
+    def register_resolvers(self):
+        """Register the resolution strategies, in the order they should be tried"""
+        registry = self.resolvers
+        table = self.resolver_config.table
+        registry.register('explorer', self.resolve_explorer, priority=10,
+                          processes=['explorer.exe'], classes=['CabinetWClass'])
+        registry.register('workspace', self.resolve_workspace, priority=15,
+                          processes=EDITOR_STATE_DIRS)
+        registry.register('editor', self.resolve_editor, priority=20,
+                          processes=table.editor_processes)
+        registry.register('github', self.resolve_github_repo, priority=30,
+                          processes=table.browser_processes)
+        # Always answers for browsers, and the answer carries a fresh screenshot
+        registry.register('browser', self.resolve_browser, priority=40,
+                          processes=table.browser_processes, cacheable=False, concurrent=False)
+        # Shell cwds change with every cd, so their answers are never cached
+        registry.register('shell', self.resolve_shell_cwd, priority=45,
+                          processes=table.terminal_processes, cacheable=False)
+        # Not cached: a console keeps its title across cd, so a cached answer would go stale
+        registry.register('cwd', self.resolve_cwd, priority=50, fallback=True, cacheable=False)
+        registry.register('title', self.resolve_title_path, priority=60, fallback=True)
+        registry.register('default', self.resolve_default, priority=100, fallback=True,
+                          cacheable=False)
+    
+    def apply_resolver_config(self, table):
+        """Route the editor and browser resolvers to a reloaded process list"""
+        self.resolvers.reroute({
+            'editor': table.editor_processes,
+            'github': table.browser_processes,
+            'browser': table.browser_processes,
+            'shell': table.terminal_processes,
+        })
+    
+    def resolve_explorer(self, ctx):
+        """File Explorer - get actual folder being viewed"""
+        print("Detected File Explorer window")
+        
+        # Try COM approach
+        path = self.get_explorer_path_com(ctx.hwnd)
+        if path:
+            print(f"Explorer path found via COM: {path}")
+            return path
+        
+        # Fallback: Try to extract from window title
+        # File Explorer format: "FolderName - File Explorer" or just "FolderName"
+        if ctx.title:
+            # Remove " - File Explorer" suffix if present
+            folder_part = ctx.title.replace(" - File Explorer", "").strip()
+            
+            # A full path, else a folder of that name in one of the common locations
+            candidates = [folder_part] + [os.path.join(root, folder_part)
+                                          for root in self.resolver_config.table.explorer_roots]
+            path = self.prober.first_dir(candidates)
+            if path:
+                print(f"Found folder from title: {path}")
+                return path
+            
+            # Special case for 'Desktop' which might just show as "Desktop"
+            if folder_part.lower() == "desktop":
+                desktop = os.path.expanduser("~\\Desktop")
+                print(f"Desktop folder detected: {desktop}")
+                return desktop
+        return None
+    
+    def resolve_workspace(self, ctx):
+        """VS Code / Cursor - look the folder in the title up in the editor's recent workspaces"""
+        index = self.workspaces.get(ctx.process_name)
+        # Format: "filename - foldername - Cursor" or "foldername - Cursor"
+        parts = ctx.title.split(' - ')
+        if index is None or len(parts) < 2:
+            return None
+        path = index.lookup(parts[-2])
+        if path and self.prober.isdir(path):
+            print(f"Found workspace in editor state: {path}")
+            return path
+        return None
+    
+    def resolve_editor(self, ctx):
+        """Editors - check command line and window title for the opened folder"""
+        cmdline = ctx.process.cmdline
+        # Look for --folder-uri argument (Cursor/VS Code specific)
+        for i, arg in enumerate(cmdline):
+            if arg == '--folder-uri' and i + 1 < len(cmdline):
+                path = file_uri_to_path(cmdline[i + 1])
+                if path and self.prober.exists(path):
+                    print(f"Found folder from --folder-uri: {path}")
+                    return path
+        
+        # Look for regular folder paths in arguments
+        path = self.prober.first_dir(cmdline[1:])  # Skip exe path
+        if path:
+            print(f"Found folder in args: {path}")
+            return path
+        
+        # For Cursor/VS Code, parse the window title
+        # Format: "filename - foldername - Cursor/VS Code"
+        window_title = ctx.title
+        table = self.resolver_config.table
+        if any(suffix in window_title for suffix in table.editor_title_suffixes):
+            parts = window_title.split(' - ')
+            if len(parts) >= 3:
+                # The folder name is usually the second-to-last part
+                folder_name = parts[-2].strip()
+                # A full path, else common project locations and the parents of the script directory
+                candidates = [folder_name] + [os.path.join(search_path, folder_name)
+                                              for search_path in table.editor_roots]
+                path = self.prober.first_dir(candidates)
+                if path:
+                    print(f"Found folder from title: {path}")
+                    return path
+        return None
+    
+    def resolve_github_repo(self, ctx):
+        """Browsers on a GitHub page - open the local clone if there is one"""
+        repos = []  # (owner, repo name)
+        
+        # GitHub titles often have format: "owner/repo-name: description · GitHub"
+        if 'github.com' in ctx.title.lower():
+            match = re.search(r'([\w.-]+)/([\w.-]+)', ctx.title)
+            if match:
+                repos.append(match.groups())
+                print(f"Detected GitHub repo: {'/'.join(repos[-1])}")
+        
+        # Also check clipboard for URLs that might give context
+        try:
+            clipboard = self.desktop.clipboard_paste()
+        except Exception:
+            clipboard = None
+        if clipboard and 'github.com' in clipboard.lower():
+            match = re.search(r'github\.com/([^/]+)/([^/\s\?#]+)', clipboard)
+            if match:
+                owner, name = match.groups()
+                if name.endswith('.git'):
+                    name = name[:-4]
+                repos.append((owner, name))
+                print(f"Found GitHub URL in clipboard: {owner}/{name}")
+        
+        # Clones are matched on their remote, so renamed clones and forks are found too
+        for owner, name in repos:
+            path = self.clone_index.lookup(f"{owner}/{name}", name)
+            if path:
+                print(f"Found local clone: {path}")
+                return path
+        if repos:
+            # Maybe cloned since the last scan
+            self.clone_index.request_scan()
+        return None
+    
+    def resolve_browser(self, ctx):
+        """Browsers - take screenshot and use Downloads folder"""
+        print(f"Detected browser: {ctx.process_name}")
+        
+        # Use Downloads folder as default for browsers
+        downloads = os.path.expanduser("~\\Downloads")
+        if not self.prober.isdir(downloads):
+            downloads = os.path.expanduser("~\\Documents")
+        
+        # Take screenshot of browser window and save to the folder
+        screenshot_path = self.capture_window_to_file(ctx.hwnd, downloads)
+        if screenshot_path:
+            # Store the screenshot path to reference it later
+            self.last_screenshot = screenshot_path
+            print(f"Screenshot saved: {screenshot_path}")
+        else:
+            self.last_screenshot = None
+            print("Failed to capture screenshot")
+        
+        print(f"Using Downloads folder for browser context: {downloads}")
+        return downloads
+    
+    def usable_cwd(self, cwd):
+        """True for an existing working directory that is not a system directory"""
+        system_dirs = self.resolver_config.table.system_dirs
+        return bool(cwd) and not (system_dirs and system_dirs.search(cwd.lower())) and self.prober.exists(cwd)
+    
+    def resolve_shell_cwd(self, ctx):
+        """Terminals - working directory of the newest shell running in the window"""
+        shells = self.resolver_config.table.shell_processes
+        with self.tracer.span('process_tree'):
+            self.process_tree.refresh()
+            shell = self.process_tree.newest_descendant(ctx.process.pid, ctx.process.create_time, shells)
+            if shell is None:
+                # A classic console host is started by the shell it hosts
+                shell = self.process_tree.parent(ctx.process.pid)
+                if shell is None or shell.name not in shells:
+                    return None
+        cwd = self.process_cache.current_cwd(shell.pid, shell.create_time)
+        if self.usable_cwd(cwd):
+            print(f"Using working directory of {shell.name} (PID {shell.pid}): {cwd}")
+            return cwd
+        return None
+    
+    def resolve_cwd(self, ctx):
+        """Process working directory (not exe location)"""
+        # Read live: a console's shell can cd at any time, the cached ProcessInfo may be stale
+        cwd = self.process_cache.current_cwd(ctx.process.pid, ctx.process.create_time)
+        # Only use if it's not a system directory
+        if self.usable_cwd(cwd):
+            print(f"Using working directory: {cwd}")
+            return cwd
+        return None
+    
+    def resolve_title_path(self, ctx):
+        """Extract a drive path from the window title (last resort)"""
+        if not ctx.title:
+            return None
+        for pattern in self.resolver_config.table.title_patterns:
+            match = pattern.search(ctx.title)
+            if match:
+                path = match.group(1).strip()
+                result = self.prober.stat(path)
+                if result is not None:
+                    if not stat.S_ISDIR(result.st_mode):
+                        path = os.path.dirname(path)
+                    print(f"Found in title: {path}")
+                    return path
+        return None
+    
+    def resolve_default(self, ctx):
+        """Documents folder when nothing else matched"""
+        default = os.path.expanduser("~\\Documents")
+        print(f"Using default: {default}")
+        return default
+    
     def launch_gemini(self, path, is_browser=False):
         """Launch Gemini in the specified path"""
         print(f"Launching Gemini in: {path}")
@@ -384,7 +2782,8 @@ class GeminiDoubleMiddleClick:
             # Copy the @filename to clipboard for easy pasting
             reference = f"@{screenshot_name}"
             try:
-                pyperclip.copy(reference)
+                with self.tracer.span('clipboard_copy'):
+                    self.desktop.clipboard_copy(reference)
                 print(f"\n💡 Browser screenshot saved as: {screenshot_name}")
                 print(f"   '{reference}' copied to clipboard - just paste it!")
                 print(f"   Example prompt: 'Explain what's shown in {reference}'")
@@ -394,67 +2793,174 @@ class GeminiDoubleMiddleClick:
         
         try:
             # Just launch Gemini normally - files are referenced within prompts
-            subprocess.Popen(
-                f'start "Gemini CLI" cmd /k "cd /d "{path}" && gemini"',
-                shell=True
-            )
-            print("✓ Launched successfully")
-        except:
-            try:
-                subprocess.Popen(
-                    f'start "Gemini CLI" cmd /k "cd /d "{path}" && npx @google/gemini-cli"',
-                    shell=True
-                )
-                print("✓ Launched with npx")
-            except Exception as e:
-                print(f"✗ Launch failed: {e}")
+            with self.tracer.span('spawn'):
+                attached = self.warm_pool is not None and self.warm_pool.acquire(path)
+                if not attached:
+                    self.launcher.launch(path)
+            if attached:
+                print("✓ Attached to a warm Gemini session")
+            else:
+                print("✓ Launched successfully")
+        except Exception as e:
+            print(f"✗ Launch failed: {e}")
+        
+        if self.warm_pool is not None:
+            # The pool's thread parks a fresh session for the directories used most recently
+            self.warm_pool.note_directory(path)
+    
+    def handle_gesture(self, gesture):
+        """Resolve the window under a gesture and launch Gemini (runs on the pipeline worker)"""
+        self.tracer.gesture += 1
+        # Time from the hook seeing the click to the worker picking it up
+        self.tracer.record('hook_to_worker', max(0.0, time.time() - gesture.time))
+        if gesture.speculative:
+            with self.tracer.span('speculation'):
+                self.speculate(gesture)
+            return
+        
+        print(f"\n🖱️ Shift + Double middle-click at ({gesture.x}, {gesture.y})")
+        
+        with self.tracer.span('gesture'):
+            # Get path and check if browser
+            with self.tracer.span('resolve'):
+                path = self.get_path_from_window(gesture.x, gesture.y, gesture.time)
+            
+            # Check if we captured a screenshot (indicates browser)
+            is_browser = self.last_screenshot is not None
+            
+            self.launch_gemini(path, is_browser)
+        
+        if self.recorder is not None:
+            self.record_gesture(gesture, path)
     
-    def on_press(self, key):
-        """Handle key press"""
-        if key == keyboard.Key.shift_l or key == keyboard.Key.shift_r:
-            self.shift_pressed = True
+    def record_gesture(self, gesture, path):
+        """Write the gesture just handled, with its window, result and stage timings"""
+        ctx = self.last_context
+        stages = {}
+        for gesture_id, name, _, seconds in reversed(self.tracer.spans):
+            if gesture_id != self.tracer.gesture:
+                break
+            stages[name] = round(stages.get(name, 0.0) + seconds * 1000, 3)
+        record = {
+            't': round(gesture.time, 3),
+            'x': gesture.x,
+            'y': gesture.y,
+            'window': [ctx.hwnd, ctx.title, ctx.window_class] if ctx else None,
+            'process': list(ctx.process) if ctx else None,
+            'source': self.last_source,
+            'path': path,
+            'stages': stages,
+        }
+        self.recorder.write(record, self.resolver_config.overrides,
+                            self.window_key(ctx) if ctx else None, cached=not self.last_resolved)
     
-    def on_release(self, key):
-        """Handle key release"""
-        if key == keyboard.Key.shift_l or key == keyboard.Key.shift_r:
-            self.shift_pressed = False
+    def trace_report(self, export_path=None):
+        """Print per-stage latency percentiles; optionally export the raw spans as JSONL"""
+        histograms = self.tracer.histograms()
+        if not histograms:
+            print("No trace spans recorded (is tracing enabled?)")
+        for name, row in sorted(histograms.items()):
+            print(f"  {name:<24} n={row['count']:<5} p50 {row['p50_ms']:8.2f} ms  "
+                  f"p95 {row['p95_ms']:8.2f} ms  p99 {row['p99_ms']:8.2f} ms")
+        if export_path:
+            count = self.tracer.export_jsonl(export_path)
+            print(f"✓ Exported {count} spans to {export_path}")
+        return histograms
     
     def on_click(self, x, y, button, pressed):
         """Handle mouse clicks"""
-        # Only process if Shift is held down
-        if not self.shift_pressed:
+        if button != mouse.Button.middle or not pressed:
             return
+        
+        # Only process if Shift is held down - sampled now, no keyboard hook needed
+        if not self.modifiers.shift_pressed():
+            return
+        
+        current_time = time.time()
+        
+        # Check if it's a double-click
+        if current_time - self.last_middle_click_time < self.double_click_threshold:
+            # Double-click detected! Only record it here - the hook thread
+            # must not do any window or process lookups
+            self.pipeline.submit(Gesture(x, y, current_time))
             
-        if button == mouse.Button.middle and pressed:
-            current_time = time.time()
-            
-            # Check if it's a double-click
-            if current_time - self.last_middle_click_time < self.double_click_threshold:
-                # Double-click detected!
-                print(f"\n🖱️ Shift + Double middle-click at ({x}, {y})")
-                
-                # Get path and check if browser
-                path = self.get_path_from_window(x, y)
-                
-                # Check if we captured a screenshot (indicates browser)
-                is_browser = self.last_screenshot is not None
-                
-                # Launch in separate thread
-                threading.Thread(
-                    target=self.launch_gemini,
-                    args=(path, is_browser),
-                    daemon=True
-                ).start()
-                
-                # Reset timer
-                self.last_middle_click_time = 0
-            else:
-                # First click
-                self.last_middle_click_time = current_time
-                self.last_click_pos = (x, y)
+            # Reset timer
+            self.last_middle_click_time = 0
+        else:
+            # First click - start resolving while the user clicks again
+            self.last_middle_click_time = current_time
+            self.last_click_pos = (x, y)
+            self.pipeline.submit(Gesture(x, y, current_time, True))
+    
+    def warm_up(self):
+        """Load the lazily imported modules and look up Gemini ahead of the first gesture"""
+        prewarm_imports()
+        if self.launcher.resolve_command() is None:
+            print("⚠ Neither 'gemini' nor 'npx' was found on PATH")
+    
+    def control_handlers(self):
+        """Commands served on the control channel"""
+        return {
+            'status': self.control_status,
+            'stats': self.control_stats,
+            'stop': self.control_stop,
+            'reload': self.control_reload,
+            'trace': self.control_trace,
+        }
+    
+    def control_status(self):
+        return {
+            'pid': os.getpid(),
+            'script': os.path.abspath(__file__),
+            'uptime': round(time.time() - self.started_at, 1),
+        }
+    
+    def control_stats(self):
+        stats = {
+            'pipeline': self.pipeline.stats(),
+            'process_cache': self.process_cache.stats(),
+            'process_tree': self.process_tree.stats(),
+            'screenshots': self.screenshot_encoder.stats(),
+            'result_cache': self.result_cache.stats(),
+            'resolvers': self.resolvers.stats(),
+            'resolver_config': self.resolver_config.stats(),
+            'clone_index': self.clone_index.stats(),
+            'prober': self.prober.stats(),
+            'speculation': {'hits': self.speculation_hits, 'misses': self.speculation_misses},
+            'trace': self.tracer.histograms(),
+        }
+        if self.prefetcher is not None:
+            stats['prefetch'] = self.prefetcher.stats()
+        if self.warm_pool is not None:
+            stats['warm_pool'] = self.warm_pool.stats()
+        return stats
+    
+    def control_trace(self, path=None):
+        """Export the buffered trace spans as JSONL, to path or trace.jsonl in the state directory"""
+        path = path or os.path.join(self.state_dir, 'trace.jsonl')
+        count = self.tracer.export_jsonl(path)
+        return {'path': path, 'spans': count, 'enabled': self.tracer.enabled}
+    
+    def control_stop(self):
+        self.running = False
+        return {'pid': os.getpid(), 'stopping': True}
+    
+    def control_reload(self):
+        """Restart the daemon from the script on disk once this one has shut down"""
+        self.reload_requested = True
+        self.running = False
+        return {'pid': os.getpid(), 'reloading': True}
     
     def run(self):
-        """Run the mouse and keyboard listeners"""
+        """Run the mouse listener"""
+        # Claim the control channel first - it doubles as the single-instance lock
+        control = ControlServer(self.control_handlers())
+        try:
+            control.start()
+        except AlreadyRunning:
+            print("✗ The hotkey is already running (use restart_hotkey.py to restart it)")
+            return
+        
         print("Gemini Shift + Double Middle-Click Launcher")
         print("===========================================")
         print("✓ Running! Hold 'Shift' and double middle-click any window")
@@ -462,26 +2968,97 @@ class GeminiDoubleMiddleClick:
         print("✓ Press Ctrl+C in this console window to exit")
         print("  (Note: Ctrl+C only works when this console window is focused)\n")
         
-        # Create and start listeners
-        mouse_listener = mouse.Listener(on_click=self.on_click)
-        keyboard_listener = keyboard.Listener(
-            on_press=self.on_press,
-            on_release=self.on_release
-        )
+        self.pipeline.start()
         
+        # Create and start the listener; everything but middle-button presses
+        # is filtered out inside the hook
+        mouse_listener = mouse.Listener(
+            on_click=self.on_click,
+            win32_event_filter=middle_button_filter
+        )
         mouse_listener.start()
-        keyboard_listener.start()
+        
+        # Listening - everything else warms up in the background
+        self.explorer_shell.start()
+        self.clone_index.start()
+        for index in self.workspaces.values():
+            index.start()
+        if self.prefetcher is not None:
+            self.prefetcher.start()
+        if self.warm_pool is not None:
+            self.warm_pool.start()
+        threading.Thread(target=self.warm_up, name="warm-up", daemon=True).start()
         
         try:
             # Keep the main thread alive
             while self.running:
                 time.sleep(0.1)
         except KeyboardInterrupt:
-            print("\n\nShutting down...")
-            self.running = False
-            mouse_listener.stop()
-            keyboard_listener.stop()
-            return
+            pass
+        
+        print("\n\nShutting down...")
+        self.running = False
+        if self.tracer.enabled:
+            # Printed output is lost under pythonw, so the spans are also kept on disk
+            self.trace_report(os.path.join(self.state_dir, 'trace.jsonl'))
+        mouse_listener.stop()
+        self.pipeline.stop()
+        self.screenshot_encoder.stop()
+        self.result_cache.stop()
+        self.explorer_shell.stop()
+        self.clone_index.stop()
+        for index in self.workspaces.values():
+            index.stop()
+        self.prober.stop()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        if self.warm_pool is not None:
+            self.warm_pool.stop()
+        if self.resolver_pool is not None:
+            self.resolver_pool.shutdown(wait=False, cancel_futures=True)
+        control.stop()
+
+def env_flag(name):
+    """Read an on/off environment variable; unset, empty, 0, false, no and off are off"""
+    value = os.environ.get(name, '').strip().lower()
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value not in ('', '0', 'false', 'no', 'off'):
+        print(f"⚠ {name} should be 1 or 0, not {value!r}; treating it as off")
+    return False
+
+
+def env_int(name, default, low=None, high=None):
+    """Read a whole-number environment variable; default when unset or out of range"""
+    value = os.environ.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        number = None
+    if number is None or (low is not None and number < low) or (high is not None and number > high):
+        print(f"⚠ {name}={value!r} is not a whole number in range, using {default}")
+        return default
+    return number
+
+
+def screenshot_options_from_env():
+    """ScreenshotEncoder settings from the GEMINI_HOTKEY_SCREENSHOT_* variables"""
+    options = {
+        'compress_level': env_int('GEMINI_HOTKEY_SCREENSHOT_COMPRESS_LEVEL', 6, 0, 9),
+        'quality': env_int('GEMINI_HOTKEY_SCREENSHOT_QUALITY', 85, 1, 100),
+        'max_dimension': env_int('GEMINI_HOTKEY_SCREENSHOT_MAX_DIMENSION', 0, 0) or None,
+    }
+    image_format = os.environ.get('GEMINI_HOTKEY_SCREENSHOT_FORMAT', '').strip().upper()
+    image_format = {'JPG': 'JPEG'}.get(image_format, image_format)
+    if image_format in ScreenshotEncoder.EXTENSIONS:
+        options['image_format'] = image_format
+    elif image_format:
+        print(f"⚠ GEMINI_HOTKEY_SCREENSHOT_FORMAT must be one of "
+              f"{', '.join(ScreenshotEncoder.EXTENSIONS)}, keeping PNG")
+    return options
+
 
 def main():
     # First, install pynput if needed
@@ -493,8 +3070,23 @@ def main():
         print("Please restart the script")
         return
     
-    launcher = GeminiDoubleMiddleClick()
+    # GEMINI_HOTKEY_TRACE=1 records per-stage latency spans,
+    # GEMINI_HOTKEY_RECORD=<file> logs every gesture for `benchmark.py --recording <file>`,
+    # GEMINI_HOTKEY_PARALLEL=1 runs resolvers concurrently under a deadline,
+    # GEMINI_HOTKEY_PREFETCH=1 resolves windows in the background as they gain focus,
+    # GEMINI_HOTKEY_WARM_SESSIONS=<n> keeps n Gemini sessions parked in recent directories,
+    # GEMINI_HOTKEY_SCREENSHOT_* set the browser screenshot format and size
+    launcher = GeminiDoubleMiddleClick(parallel_resolution=env_flag('GEMINI_HOTKEY_PARALLEL'),
+                                       prefetch=env_flag('GEMINI_HOTKEY_PREFETCH'),
+                                       warm_sessions=env_int('GEMINI_HOTKEY_WARM_SESSIONS', 0, 0),
+                                       screenshot_options=screenshot_options_from_env(),
+                                       trace=env_flag('GEMINI_HOTKEY_TRACE'),
+                                       record=os.environ.get('GEMINI_HOTKEY_RECORD'))
     launcher.run()
+    
+    if launcher.reload_requested:
+        # The control channel is released, so the new instance can claim it
+        subprocess.Popen([sys.executable] + sys.argv, cwd=os.getcwd())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
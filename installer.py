@@ -1,16 +1,73 @@
 import os
+import re
 import sys
 import shutil
 import subprocess
-import winreg
 import time
+import importlib
+import importlib.metadata
+import py_compile
+
+try:
+    import winreg
+except ImportError:
+    winreg = None
 
 # --- Configuration ---
 APP_NAME = "Ask Gemini Hotkey"
 INSTALL_DIR_NAME = "AskGeminiHotkey"
 SCRIPT_NAME = "hotkey.py"
 STARTUP_REG_KEY = r"Software\Microsoft\Windows\CurrentVersion\Run"
-REQUIRED_PACKAGES = ['pynput', 'psutil', 'pywin32']
+REQUIRED_PACKAGES = ['pynput', 'psutil'] + (['pywin32'] if os.name == 'nt' else [])
+# Started at login instead of hotkey.py itself: a script run directly is
+# compiled on every start, an imported module is loaded from __pycache__
+LAUNCHER_NAME = "start_hotkey.py"
+LAUNCHER_SOURCE = "import hotkey\nhotkey.main()\n"
+
+# --- Startup Registration ---
+
+class RunKeyStartup:
+    """Startup entries in the current user's Run registry key"""
+
+    def get(self, name):
+        """Return the command registered under name, or None"""
+        try:
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, STARTUP_REG_KEY, 0, winreg.KEY_READ) as key:
+                return winreg.QueryValueEx(key, name)[0]
+        except FileNotFoundError:
+            return None
+
+    def set(self, name, command):
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, STARTUP_REG_KEY, 0, winreg.KEY_WRITE) as key:
+            winreg.SetValueEx(key, name, 0, winreg.REG_SZ, command)
+
+    def delete(self, name):
+        """Remove the entry; raises FileNotFoundError if there is none"""
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, STARTUP_REG_KEY, 0, winreg.KEY_WRITE) as key:
+            winreg.DeleteValue(key, name)
+
+
+class MemoryStartup:
+    """Startup entries kept in a dict, for trying the installer off Windows"""
+
+    def __init__(self, entries=None):
+        self.entries = dict(entries or {})
+
+    def get(self, name):
+        return self.entries.get(name)
+
+    def set(self, name, command):
+        self.entries[name] = command
+
+    def delete(self, name):
+        if name not in self.entries:
+            raise FileNotFoundError(name)
+        del self.entries[name]
+
+
+def default_startup():
+    """The Run key on Windows, an in-memory table elsewhere"""
+    return RunKeyStartup() if winreg is not None else MemoryStartup()
 
 # --- Helper Functions ---
 
@@ -23,18 +80,12 @@ def get_install_path():
         print("ERROR: APPDATA environment variable not found.")
         sys.exit(1)
 
-def is_installed():
+def is_installed(startup, install_path):
     """Checks if the application is installed."""
-    install_path = get_install_path()
     script_path = os.path.join(install_path, SCRIPT_NAME)
     
     # Check for registry key
-    try:
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, STARTUP_REG_KEY, 0, winreg.KEY_READ) as key:
-            winreg.QueryValueEx(key, APP_NAME)
-        registry_exists = True
-    except FileNotFoundError:
-        registry_exists = False
+    registry_exists = startup.get(APP_NAME) is not None
         
     # Check for script file
     file_exists = os.path.exists(script_path)
@@ -50,12 +101,23 @@ def get_pythonw_path():
         return None
     return pythonw_exe
 
+def canonical_name(name):
+    """Normalize a distribution name the way pip does (PEP 503)"""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def find_missing_packages(required=REQUIRED_PACKAGES):
+    """Return the required distributions that are not installed"""
+    installed = {
+        canonical_name(dist.metadata['Name'])
+        for dist in importlib.metadata.distributions()
+        if dist.metadata['Name']
+    }
+    return [pkg for pkg in required if canonical_name(pkg) not in installed]
+
 def check_and_install_dependencies():
     """Checks for required packages and installs them if missing."""
     print("Checking for required packages...")
-    installed_packages = subprocess.check_output([sys.executable, '-m', 'pip', 'list']).decode('utf-8')
-    
-    missing_packages = [pkg for pkg in REQUIRED_PACKAGES if pkg.lower() not in installed_packages.lower()]
+    missing_packages = find_missing_packages()
     
     if not missing_packages:
         print("✓ All required packages are already installed.")
@@ -65,32 +127,42 @@ def check_and_install_dependencies():
     print("Attempting to install...")
     
     try:
-        for package in missing_packages:
-            print(f"Installing {package}...")
-            subprocess.check_call([sys.executable, '-m', 'pip', 'install', package])
+        # One pip run resolves and installs everything together
+        subprocess.check_call([sys.executable, '-m', 'pip', 'install'] + missing_packages)
+        importlib.invalidate_caches()
         print("✓ All packages installed successfully.")
         return True
     except subprocess.CalledProcessError as e:
         print(f"✗ ERROR: Failed to install packages: {e}")
-        print("Please install them manually using: pip install pynput psutil pywin32")
+        print(f"Please install them manually using: pip install {' '.join(REQUIRED_PACKAGES)}")
         return False
 
 # --- Core Functions ---
 
-def install():
-    """Installs the hotkey script and adds it to startup."""
+def precompile(install_dir):
+    """Compile the installed module to bytecode so logins skip the compile step"""
+    source = os.path.join(install_dir, SCRIPT_NAME)
+    py_compile.compile(source, doraise=True)
+
+def install(startup=None, install_dir=None, dependencies=check_and_install_dependencies):
+    """Installs the hotkey script and adds it to startup.
+
+    dependencies() returns False if the required packages are missing and
+    could not be installed.
+    """
     print(f"--- Installing {APP_NAME} ---")
+    startup = startup or default_startup()
+    install_dir = install_dir or get_install_path()
 
-    if is_installed():
+    if is_installed(startup, install_dir):
         print("✓ Already installed. To reinstall, please uninstall first.")
         return
 
     # 1. Check dependencies
-    if not check_and_install_dependencies():
+    if not dependencies():
         sys.exit(1)
 
     # 2. Get paths
-    install_dir = get_install_path()
     source_script_path = os.path.join(os.path.dirname(__file__), SCRIPT_NAME)
     dest_script_path = os.path.join(install_dir, SCRIPT_NAME)
     pythonw_path = get_pythonw_path()
@@ -107,13 +179,22 @@ def install():
     os.makedirs(install_dir, exist_ok=True)
     print(f"Copying '{SCRIPT_NAME}' to '{install_dir}'")
     shutil.copy(source_script_path, dest_script_path)
+    launcher_path = os.path.join(install_dir, LAUNCHER_NAME)
+    with open(launcher_path, 'w', encoding='utf-8') as f:
+        f.write(LAUNCHER_SOURCE)
+    print("Precompiling bytecode...")
+    try:
+        precompile(install_dir)
+        print("✓ Bytecode compiled.")
+    except py_compile.PyCompileError as e:
+        # Still runs, it just compiles on first start instead
+        print(f"✗ WARNING: Could not precompile '{SCRIPT_NAME}': {e}")
 
     # 4. Add to startup registry
-    command = f'"{pythonw_path}" "{dest_script_path}"'
+    command = f'"{pythonw_path}" "{launcher_path}"'
     print("Adding to Windows startup...")
     try:
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, STARTUP_REG_KEY, 0, winreg.KEY_WRITE) as key:
-            winreg.SetValueEx(key, APP_NAME, 0, winreg.REG_SZ, command)
+        startup.set(APP_NAME, command)
         print("✓ Registry key added successfully.")
     except Exception as e:
         print(f"✗ ERROR: Could not set registry key: {e}")
@@ -128,19 +209,20 @@ def install():
     print(f'  start "" {command}')
 
 
-def uninstall():
+def uninstall(startup=None, install_dir=None):
     """Removes the hotkey script and its startup entry."""
     print(f"--- Uninstalling {APP_NAME} ---")
+    startup = startup or default_startup()
+    install_dir = install_dir or get_install_path()
     
-    if not is_installed():
+    if not is_installed(startup, install_dir):
         print("✓ Application is not installed.")
         return
 
     # 1. Remove registry key
     print("Removing startup registry key...")
     try:
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, STARTUP_REG_KEY, 0, winreg.KEY_WRITE) as key:
-            winreg.DeleteValue(key, APP_NAME)
+        startup.delete(APP_NAME)
         print("✓ Registry key removed.")
     except FileNotFoundError:
         print("✓ Registry key already removed.")
@@ -149,7 +231,6 @@ def uninstall():
         print("  -> You may need to remove it manually using 'regedit'.")
 
     # 2. Remove installation directory
-    install_dir = get_install_path()
     if os.path.exists(install_dir):
         print(f"Removing directory: {install_dir}")
         # Add a small delay to ensure the process is not running
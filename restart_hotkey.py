@@ -1,48 +1,40 @@
 #!/usr/bin/env python3
 """
-Kill old hotkey process and start the new one
+Restart the running hotkey daemon through its control channel
 """
 
-import psutil
 import os
 import subprocess
 import time
 
-def kill_old_processes():
-    """Find and kill all hotkey processes except this one"""
-    current_pid = os.getpid()
-    killed = 0
-    
-    print("Looking for running hotkey processes...")
+from hotkey import send_control
+
+def reload_running_daemon(timeout=10.0):
+    """Ask the daemon to reload and wait for the new instance to answer"""
+    try:
+        reply = send_control('reload')
+    except TimeoutError as e:
+        # Something holds the channel but does not answer, e.g. a hung daemon
+        print(f"✗ {e}")
+        return False
+    if reply is None:
+        return None
+    old_pid = reply['pid']
+    print(f"Asked PID {old_pid} to reload")
     
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+    # The old instance releases the channel before spawning its replacement,
+    # so the first answer from a different PID is the new version
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
         try:
-            # Skip current process
-            if proc.info['pid'] == current_pid:
-                continue
-                
-            # Check if it's a Python process
-            if proc.info['name'] and 'python' in proc.info['name'].lower():
-                cmdline = proc.info.get('cmdline', [])
-                if cmdline:
-                    # Check if it's running any hotkey script
-                    for arg in cmdline:
-                        if any(script in str(arg) for script in [
-                            'hotkey.py', 'hotkey_double_middle.py', 
-                            'gemini_hotkey', 'GeminiHotkey'
-                        ]):
-                            print(f"Found: PID {proc.info['pid']} - {' '.join(cmdline[:3])}...")
-                            try:
-                                proc.kill()
-                                killed += 1
-                                print(f"  ✓ Killed")
-                            except:
-                                print(f"  ✗ Could not kill")
-                            break
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            pass
-    
-    return killed
+            status = send_control('status')
+        except TimeoutError:
+            # Still shutting down, or the new instance is busy starting up
+            status = None
+        if status is not None and status['pid'] != old_pid:
+            return status
+        time.sleep(0.05)
+    return False
 
 def start_new_version():
     """Start the new hotkey script"""
@@ -61,7 +53,7 @@ def start_new_version():
         subprocess.Popen(["pythonw", new_script])
         print("✓ New version started in background")
         return True
-    except:
+    except OSError:
         # Fallback to regular python
         subprocess.Popen(["python", new_script])
         print("✓ New version started")
@@ -71,23 +63,20 @@ def main():
     print("Hotkey Process Restart Tool")
     print("===========================\n")
     
-    # Kill old processes
-    killed = kill_old_processes()
+    status = reload_running_daemon()
     
-    if killed > 0:
-        print(f"\nKilled {killed} old process(es)")
-        print("Waiting 2 seconds...")
-        time.sleep(2)
+    if status is None:
+        print("No running hotkey found")
+        if start_new_version():
+            print("\n✅ Success! The Shift + double middle-click hotkey is now running")
+        else:
+            print("\n❌ Failed to start new version")
+    elif status is False:
+        print("\n❌ No new instance answered")
     else:
-        print("\nNo old processes found")
-    
-    # Start new version
-    # if start_new_version():
-    #     print("\n✅ Success! The new Shift + double middle-click version is now running")
-    #     print("\nYou can close this window")
-    # else:
-    #     print("\n❌ Failed to start new version")
+        print(f"\n✅ Reloaded - new instance is PID {status['pid']}")
+        print("\nYou can close this window")
 
 if __name__ == "__main__":
     main()
-    input("\nPress Enter to exit...")
\ No newline at end of file
+    input("\nPress Enter to exit...")
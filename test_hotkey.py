@@ -0,0 +1,373 @@
+"""Tests for hotkey.py that run without a desktop, on the fakes from benchmark.py"""
+
+import errno
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import hotkey
+from benchmark import FakeModifiers, FakeMounts, FakeProcess, write_editor_state
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """GeminiDoubleMiddleClick whose pipeline only queues gestures, never handles them"""
+    # pynput cannot load without a display; on_click only compares the button
+    monkeypatch.setattr(hotkey, 'mouse', SimpleNamespace(Button=SimpleNamespace(middle='middle', left='left')))
+    handled = []
+    instance = hotkey.GeminiDoubleMiddleClick(state_dir=str(tmp_path), appdata_dir=str(tmp_path),
+                                              modifiers=FakeModifiers())
+    instance.pipeline = hotkey.GesturePipeline(handled.append)
+    yield instance
+    instance.prober.stop()
+    instance.result_cache.stop()
+
+
+def queued(pipeline):
+    return list(pipeline.queue.queue)
+
+
+def test_on_click_only_queues_gestures(app):
+    started = time.perf_counter()
+    app.on_click(100, 200, 'middle', True)
+    first = time.perf_counter() - started
+    started = time.perf_counter()
+    app.on_click(102, 201, 'middle', True)
+    second = time.perf_counter() - started
+
+    # The hook thread must not wait on window or process lookups
+    assert first < 0.005
+    assert second < 0.005
+    gestures = queued(app.pipeline)
+    assert [gesture.speculative for gesture in gestures] == [True, False]
+    assert (gestures[0].x, gestures[0].y) == (100, 200)
+    assert (gestures[1].x, gestures[1].y) == (102, 201)
+
+
+def test_on_click_ignores_other_buttons_and_unshifted_clicks(app):
+    app.on_click(100, 200, 'left', True)
+    app.on_click(100, 200, 'middle', False)
+    app.modifiers.shift = False
+    app.on_click(100, 200, 'middle', True)
+    assert queued(app.pipeline) == []
+
+
+@pytest.fixture
+def make_prober():
+    probers = []
+    def make(mounts, **options):
+        prober = hotkey.PathProber(fs_stat=mounts, **options)
+        probers.append(prober)
+        return prober
+    yield make
+    for prober in probers:
+        prober.stop()
+
+
+def test_prober_skips_a_gone_volume(make_prober):
+    mounts = FakeMounts(['/home/user/project'], gone=['/mnt/usb'])
+    prober = make_prober(mounts)
+    assert prober.stat('/mnt/usb/project') is None
+    calls = mounts.calls
+
+    assert prober.first_dir(['/mnt/usb/other', '/home/user/project']) == '/home/user/project'
+    assert mounts.calls == calls + 1  # only the healthy volume was probed
+    assert prober.stats()['skipped'] == 1
+    assert prober.stats()['unreachable'] == ['/mnt/usb']
+
+
+def windows_error(code, path):
+    # OSError only maps winerror itself on Windows; set it so the test runs anywhere
+    error_class = {53: FileNotFoundError, 67: FileNotFoundError, 15: FileNotFoundError,
+                   21: PermissionError}.get(code, OSError)
+    error = error_class(errno.EINVAL, f"WinError {code}", path)
+    error.winerror = code
+    return error
+
+
+@pytest.mark.parametrize('code', [53, 67, 15, 21])
+def test_prober_marks_a_volume_down_by_windows_error_code(make_prober, code):
+    def fs_stat(path):
+        raise windows_error(code, path)
+    prober = make_prober(fs_stat)
+    path = 'x:\\projects\\widget' if os.name == 'nt' else '/mnt/share/widget'
+    assert prober.stat(path) is None
+    assert prober.stats()['unreachable'] == [hotkey.volume_of(path)]
+
+
+@pytest.mark.parametrize('error', [
+    windows_error(123, 'c:\\users\\me\\bad:name'),  # ERROR_INVALID_NAME
+    windows_error(2, 'c:\\users\\me\\gone'),  # ERROR_FILE_NOT_FOUND
+    windows_error(5, 'c:\\users\\me\\private'),  # ERROR_ACCESS_DENIED
+    OSError(errno.ENAMETOOLONG, "File name too long"),
+])
+def test_prober_treats_other_errors_as_a_miss(make_prober, error):
+    def fs_stat(path):
+        raise error
+    prober = make_prober(fs_stat)
+    path = 'c:\\users\\me\\bad:name' if os.name == 'nt' else '/home/me/bad:name'
+    assert prober.stat(path) is None
+    assert prober.stats()['unreachable'] == []
+
+
+def test_prober_abandons_a_hung_probe(make_prober):
+    mounts = FakeMounts(['/mnt/nas/project'], slow=['/mnt/nas'], delay=1.0)
+    prober = make_prober(mounts, timeout=0.05)
+    started = time.perf_counter()
+    assert prober.isdir('/mnt/nas/project') is False
+    assert time.perf_counter() - started < 0.5
+    assert prober.stats()['timeouts'] == 1
+    assert prober.stats()['unreachable'] == ['/mnt/nas']
+
+
+def test_prober_does_not_blame_a_queued_probe(make_prober):
+    # One worker: the healthy volume's probe waits in the queue behind the hung one
+    mounts = FakeMounts(['/home/user/project'], slow=['/mnt/nas'], delay=0.3)
+    prober = make_prober(mounts, timeout=0.05, workers=1)
+    assert prober.stat_all(['/mnt/nas/project', '/home/user/project']) == [None, None]
+    assert prober.stats()['unreachable'] == ['/mnt/nas']
+    assert prober.stats()['timeouts'] == 1
+
+
+def control_address(tmp_path):
+    if os.name == 'nt':
+        return rf'\\.\pipe\gemini-hotkey-test-{os.getpid()}'
+    return str(tmp_path / 'control.sock')
+
+
+def test_trace_command_exports_spans(app, tmp_path):
+    app.tracer.enabled = True
+    with app.tracer.span('resolve'):
+        pass
+    server = hotkey.ControlServer(app.control_handlers(), control_address(tmp_path))
+    server.start()
+    try:
+        reply = hotkey.send_control('trace', server.address)
+        assert reply['ok'] and reply['spans'] == 1
+        assert reply['path'] == str(tmp_path / 'trace.jsonl')
+        target = tmp_path / 'spans.jsonl'
+        assert hotkey.send_control('trace', server.address, path=str(target))['path'] == str(target)
+        assert '"stage": "resolve"' in target.read_text()
+    finally:
+        server.stop()
+
+
+def test_control_server_survives_a_failing_handler(tmp_path):
+    def fail():
+        raise RuntimeError("boom")
+    server = hotkey.ControlServer({'fail': fail, 'status': lambda: {'pid': 1}}, control_address(tmp_path))
+    server.start()
+    try:
+        reply = hotkey.send_control('fail', server.address)
+        assert reply == {'ok': False, 'error': 'RuntimeError: boom'}
+        assert hotkey.send_control('status', server.address, unexpected=1)['ok'] is False
+        assert hotkey.send_control('status', server.address) == {'pid': 1, 'ok': True}
+    finally:
+        server.stop()
+
+
+class FakeSessions:
+    """WarmSessionPool backend that records which thread started each session"""
+
+    def __init__(self):
+        self.threads = []
+        self.started = threading.Event()
+
+    def start(self, directory):
+        self.threads.append(threading.current_thread().name)
+        self.started.set()
+        return directory
+
+    def alive(self, session):
+        return True
+
+    def reveal(self, session):
+        return True
+
+    def memory(self, session):
+        return 0
+
+    def terminate(self, session):
+        pass
+
+
+def test_warm_pool_replenishes_on_its_own_thread(tmp_path):
+    backend = FakeSessions()
+    pool = hotkey.WarmSessionPool(backend, size=1)
+    pool.start()
+    try:
+        pool.note_directory(str(tmp_path))
+        assert backend.started.wait(2.0)
+        assert backend.threads == ['warm-pool']
+        assert pool.acquire(str(tmp_path))
+    finally:
+        pool.stop()
+
+
+def test_cwd_fallback_follows_cd_in_a_console(tmp_path):
+    first, second = tmp_path / 'first', tmp_path / 'second'
+    first.mkdir()
+    second.mkdir()
+    shell = FakeProcess(40, 'cmd.exe', ['cmd.exe'], str(first))
+    app = hotkey.GeminiDoubleMiddleClick(state_dir=str(tmp_path), appdata_dir=str(tmp_path),
+                                         modifiers=FakeModifiers(), process_factory={40: shell}.__getitem__)
+    try:
+        ctx = hotkey.WindowContext(7, app.process_cache.get(40), 'cmd.exe', 'Command Prompt', 'ConsoleWindowClass')
+        assert app.resolve_cwd(ctx) == str(first)
+        shell._cwd = str(second)  # cd, the console title stays the same
+        ctx = ctx._replace(process=app.process_cache.get(40))
+        assert app.resolve_cwd(ctx) == str(second)
+    finally:
+        app.prober.stop()
+        app.result_cache.stop()
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, False), ('', False), ('0', False), ('false', False), ('Off', False), ('maybe', False),
+    ('1', True), ('true', True), ('YES', True), ('on', True),
+])
+def test_env_flag(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv('GEMINI_HOTKEY_TEST_FLAG', raising=False)
+    else:
+        monkeypatch.setenv('GEMINI_HOTKEY_TEST_FLAG', value)
+    assert hotkey.env_flag('GEMINI_HOTKEY_TEST_FLAG') is expected
+
+
+def test_screenshot_options_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv('GEMINI_HOTKEY_SCREENSHOT_FORMAT', 'jpg')
+    monkeypatch.setenv('GEMINI_HOTKEY_SCREENSHOT_QUALITY', '70')
+    monkeypatch.setenv('GEMINI_HOTKEY_SCREENSHOT_MAX_DIMENSION', '1280')
+    monkeypatch.setenv('GEMINI_HOTKEY_SCREENSHOT_COMPRESS_LEVEL', '12')  # out of range
+    options = hotkey.screenshot_options_from_env()
+    assert options == {'image_format': 'JPEG', 'quality': 70, 'max_dimension': 1280, 'compress_level': 6}
+    app = hotkey.GeminiDoubleMiddleClick(state_dir=str(tmp_path), appdata_dir=str(tmp_path),
+                                         modifiers=FakeModifiers(), screenshot_options=options)
+    try:
+        assert app.screenshot_encoder.reserve(str(tmp_path)).endswith('.jpg')
+        assert app.screenshot_encoder.max_dimension == 1280
+    finally:
+        app.prober.stop()
+        app.result_cache.stop()
+
+
+def fake_executable(directory, name):
+    directory.mkdir(exist_ok=True)
+    path = directory / (name + '.cmd' if os.name == 'nt' else name)
+    path.write_text("@echo off\n" if os.name == 'nt' else "#!/bin/sh\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_launcher_command_selection(tmp_path):
+    first, second = tmp_path / 'bin', tmp_path / 'node'
+    environ = {'PATH': str(first), 'PATHEXT': '.CMD'}
+    launcher = hotkey.GeminiLauncher(environ=environ)
+    assert launcher.resolve_command() is None
+
+    # npx fallback, then gemini installed later on the same PATH
+    npx = fake_executable(first, 'npx')
+    assert launcher.resolve_command() == [npx, '@google/gemini-cli']
+    gemini = fake_executable(first, 'gemini')
+    assert launcher.resolve_command() == [gemini]
+
+    # Found gemini is reused without another lookup while PATH stays the same
+    lookups = launcher.lookups
+    assert launcher.resolve_command() == [gemini]
+    assert launcher.lookups == lookups
+
+    # A PATH change is noticed, and an uninstalled gemini falls back to npx
+    other = fake_executable(second, 'gemini')
+    environ['PATH'] = os.pathsep.join([str(second), str(first)])
+    assert launcher.resolve_command() == [other]
+    os.remove(other)
+    os.remove(gemini)
+    assert launcher.resolve_command() == [npx, '@google/gemini-cli']
+
+
+def test_clone_roots_are_only_the_configured_project_roots(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    table = hotkey.compile_resolver_config({'project_roots': ['~/code']})
+    assert table.clone_roots == hotkey.normalize_roots(['~/code'])
+    assert os.path.normpath(str(tmp_path)) in table.project_roots
+
+
+def test_workspace_index_is_built_off_the_click_path(tmp_path, monkeypatch):
+    project = str(tmp_path / 'work' / 'widget')
+    write_editor_state(str(tmp_path), [project])
+    index = hotkey.EditorWorkspaceIndex(str(tmp_path / 'Code' / 'User'), check_interval=0.05)
+    # Before the background refresh a lookup answers from the empty index, without reading files
+    monkeypatch.setattr(index, 'refresh', lambda: pytest.fail("lookup refreshed the index"))
+    assert index.lookup('widget') is None
+    monkeypatch.undo()
+
+    index.start()
+    try:
+        deadline = time.monotonic() + 2.0
+        while index.lookup('widget') is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert index.lookup('widget') == project
+    finally:
+        index.stop()
+
+
+def stand_in_gemini(directory):
+    """A 'gemini' on a fake PATH that just stays alive like an idle session"""
+    directory.mkdir(exist_ok=True)
+    if os.name == 'nt':
+        path = directory / 'gemini.cmd'
+        path.write_text(f'@"{sys.executable}" -c "import time; time.sleep(60)"\n')
+    else:
+        path = directory / 'gemini'
+        path.write_text(f"#!{sys.executable}\nimport time\ntime.sleep(60)\n")
+        path.chmod(0o755)
+    return str(directory)
+
+
+def test_warm_pool_with_a_stand_in_cli(tmp_path):
+    launcher = hotkey.GeminiLauncher(environ={'PATH': stand_in_gemini(tmp_path / 'bin'), 'PATHEXT': '.CMD'})
+    backend = hotkey.ConsoleSessionBackend(launcher)
+    pool = hotkey.WarmSessionPool(backend, size=1)
+    parked_dir, other_dir = tmp_path / 'parked', tmp_path / 'other'
+    parked_dir.mkdir()
+    other_dir.mkdir()
+    taken = []
+    try:
+        pool.note_directory(str(parked_dir))
+        pool.replenish()
+        (session, _), = pool.sessions.values()
+        assert backend.alive(session)
+        assert backend.memory(session) > 0
+
+        # Miss: no session parked there, the parked one stays
+        assert not pool.acquire(str(other_dir))
+        assert backend.alive(session)
+        # Hit: the parked session is handed over and leaves the pool
+        assert pool.acquire(str(parked_dir))
+        taken.append(session)
+        assert pool.sessions == {}
+        assert pool.stats()['hits'] == 1 and pool.stats()['misses'] == 1
+
+        # Idle eviction terminates the session
+        pool.replenish()
+        (idle, _), = pool.sessions.values()
+        pool.idle_timeout = 0
+        pool.maintain()
+        assert pool.sessions == {}
+        assert not backend.alive(idle)
+        assert pool.stats()['evicted'] == 1
+
+        # stop() terminates whatever is still parked
+        pool.idle_timeout = 1800.0
+        pool.replenish()
+        (parked, _), = pool.sessions.values()
+        pool.stop()
+        assert not backend.alive(parked)
+    finally:
+        pool.stop()
+        for session in taken:
+            backend.terminate(session)
@@ -0,0 +1,52 @@
+"""Tests for installer.py that run off Windows, with the Run key kept in memory"""
+
+import os
+
+import pytest
+
+import installer
+
+
+@pytest.fixture
+def install_dir(tmp_path):
+    return str(tmp_path / installer.INSTALL_DIR_NAME)
+
+
+def test_install_copies_compiles_and_registers(install_dir):
+    startup = installer.MemoryStartup()
+    installer.install(startup, install_dir, dependencies=lambda: True)
+
+    launcher = os.path.join(install_dir, installer.LAUNCHER_NAME)
+    with open(launcher, encoding='utf-8') as f:
+        assert f.read() == installer.LAUNCHER_SOURCE
+    assert os.path.isfile(os.path.join(install_dir, installer.SCRIPT_NAME))
+    cached = os.listdir(os.path.join(install_dir, '__pycache__'))
+    assert any(name.startswith('hotkey.') and name.endswith('.pyc') for name in cached)
+    command = startup.get(installer.APP_NAME)
+    assert command.endswith(f'"{launcher}"')
+    assert installer.is_installed(startup, install_dir)
+
+
+def test_install_stops_when_dependencies_are_missing(install_dir):
+    startup = installer.MemoryStartup()
+    with pytest.raises(SystemExit):
+        installer.install(startup, install_dir, dependencies=lambda: False)
+    assert startup.entries == {}
+    assert not os.path.exists(install_dir)
+
+
+def test_install_leaves_an_existing_installation_alone(install_dir):
+    startup = installer.MemoryStartup()
+    installer.install(startup, install_dir, dependencies=lambda: True)
+    startup.set(installer.APP_NAME, 'kept')
+    installer.install(startup, install_dir, dependencies=lambda: pytest.fail("checked dependencies again"))
+    assert startup.get(installer.APP_NAME) == 'kept'
+
+
+def test_uninstall_removes_files_and_startup_entry(install_dir):
+    startup = installer.MemoryStartup()
+    installer.install(startup, install_dir, dependencies=lambda: True)
+    installer.uninstall(startup, install_dir)
+    assert startup.entries == {}
+    assert not os.path.exists(install_dir)
+    assert not installer.is_installed(startup, install_dir)